@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""Агрегований куб витрат для дашборду.
+
+Куб будується один раз на кожне завантаження даних у найдрібнішому розрізі,
+який потрібен вкладкам, тож KPI, матриця та графіки рахуються з нього, а не
+з сирих рядків.
+"""
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import perf
+
+CUBE_DIMS = ["Year", "Month_Num", "Department", "Type_of_expense",
+             "Parent_Description", "DistributionBase"]
+DIMENSION_COLUMNS = ("Department", "Type_of_expense", "Parent_Description", "DistributionBase")
+
+UA_MONTHS = {
+    1: "Січень", 2: "Лютий", 3: "Березень", 4: "Квітень",
+    5: "Травень", 6: "Червень", 7: "Липень", 8: "Серпень",
+    9: "Вересень", 10: "Жовтень", 11: "Листопад", 12: "Грудень",
+}
+
+
+def compact_dtypes(df: pd.DataFrame, float32: bool = False) -> pd.DataFrame:
+    """Компактні типи колонок: виміри — category, Year — int16, Month_Num — int8.
+
+    За наявності пропусків беруться nullable Int16/Int8. float32=True зберігає Sum
+    як float32 (близько 7 значущих цифр), тому вмикається лише свідомо.
+    """
+    for c in DIMENSION_COLUMNS:
+        if c in df.columns and not isinstance(df[c].dtype, pd.CategoricalDtype):
+            df[c] = df[c].astype("category")
+    for c, dtype in (("Year", "int16"), ("Month_Num", "int8")):
+        if c in df.columns:
+            df[c] = df[c].astype(dtype.capitalize() if df[c].isna().any() else dtype)
+    if float32 and "Sum" in df.columns:
+        df["Sum"] = df["Sum"].astype("float32")
+    return df
+
+
+def prepare_expenses(df: pd.DataFrame, float32: bool = False) -> pd.DataFrame:
+    """Рядки get_expenses_data для куба: Period — дата, Year і Month_Num, Sum — число.
+
+    Змінює df на місці. Назва місяця не зберігається в рядках — її підставляють
+    з UA_MONTHS при відображенні.
+    """
+    if df.empty:
+        return df
+    df["Period"] = pd.to_datetime(df["Period"], errors="coerce")
+    df["Year"] = df["Period"].dt.year
+    df["Month_Num"] = df["Period"].dt.month
+    df["Sum"] = pd.to_numeric(df["Sum"], errors="coerce").fillna(0)
+    return compact_dtypes(df, float32=float32)
+
+
+def build_cube(df: pd.DataFrame) -> pd.DataFrame:
+    """Сума Sum у розрізі CUBE_DIMS (наявних у df); порожні значення вимірів зберігаються."""
+    if df.empty:
+        return df
+    dims = [c for c in CUBE_DIMS if c in df.columns]
+    return (
+        df.groupby(dims, dropna=False, observed=True, sort=False)["Sum"]
+        .sum().reset_index()
+    )
+
+
+class DimensionIndex:
+    """Індекс вимірів фільтра: цілочисельний код на значення і рядки куба на код.
+
+    Для вимірів з небагатьма значеннями (до BITMAP_MAX_VALUES: рік, місяць) на
+    код зберігається упакована бітова маска (np.packbits), і фільтр — це OR
+    масок. Для решти (відділ, стаття) бітові маски росли б як значення × рядки,
+    тож там зберігаються відсортовані номери рядків (postings) одним масивом
+    int32 зі зсувами на код, зібраним за один argsort. Між вимірами — AND.
+    Номери рядків з порожнім значенням виміру зберігаються окремо (blanks).
+    """
+
+    DIMS = ("Year", "Month_Num", "Department", "Type_of_expense")
+    BITMAP_MAX_VALUES = 32
+
+    def __init__(self, df: pd.DataFrame, dims=DIMS):
+        self.n_rows = len(df)
+        self.codes = {}
+        self.bitmaps = {}
+        self.postings = {}
+        self.blanks = {}
+        for dim in dims:
+            if dim not in df.columns:
+                continue
+            row_codes, uniques = pd.factorize(df[dim])
+            self.codes[dim] = {v: i for i, v in enumerate(uniques)}
+            if (row_codes < 0).any():
+                self.blanks[dim] = np.flatnonzero(row_codes < 0).astype(np.int32)
+            if len(uniques) <= self.BITMAP_MAX_VALUES:
+                self.bitmaps[dim] = np.stack([
+                    np.packbits(row_codes == i) for i in range(len(uniques))
+                ]) if len(uniques) else np.zeros((0, (self.n_rows + 7) // 8), np.uint8)
+            else:
+                # Стабільне сортування лишає номери рядків кожного коду за зростанням;
+                # порожні значення (код -1) потрапляють у нульовий кошик і не адресуються.
+                order = np.argsort(row_codes, kind="stable").astype(np.int32)
+                offsets = np.zeros(len(uniques) + 2, np.int64)
+                np.cumsum(np.bincount(row_codes + 1, minlength=len(uniques) + 1), out=offsets[1:])
+                self.postings[dim] = (order, offsets)
+
+    def rows(self, dim: str, ids: list) -> np.ndarray:
+        """Номери рядків зі значеннями ids виміру з postings."""
+        order, offsets = self.postings[dim]
+        return np.concatenate([order[offsets[i + 1]:offsets[i + 2]] for i in ids])
+
+    def mask(self, **filters) -> np.ndarray:
+        """Булева маска рядків; фільтр None — усі непорожні значення виміру."""
+        packed = None
+        selected = []
+        blanks = []
+        for dim, values in filters.items():
+            if values is None:
+                if dim in self.blanks:
+                    blanks.append(self.blanks[dim])
+                continue
+            lookup = self.codes[dim]
+            ids = [lookup[v] for v in values if v in lookup]
+            if not ids:
+                return np.zeros(self.n_rows, bool)
+            if dim in self.bitmaps:
+                sel = np.bitwise_or.reduce(self.bitmaps[dim][ids], axis=0)
+                packed = sel if packed is None else packed & sel
+            else:
+                selected.append(self.rows(dim, ids))
+        if packed is None:
+            acc = np.ones(self.n_rows, bool)
+        else:
+            acc = np.unpackbits(packed, count=self.n_rows).view(bool)
+        for rows in selected:
+            sel = np.zeros(self.n_rows, bool)
+            sel[rows] = True
+            acc &= sel
+        for rows in blanks:
+            acc[rows] = False
+        return acc
+
+    def nbytes(self) -> int:
+        return (sum(b.nbytes for b in self.bitmaps.values())
+                + sum(o.nbytes + f.nbytes for o, f in self.postings.values())
+                + sum(b.nbytes for b in self.blanks.values()))
+
+
+def filter_rows(cube: pd.DataFrame, year=None, months=None,
+                departments=None, expense_types=None, index: DimensionIndex = None) -> np.ndarray:
+    """Позиції рядків куба за фільтрами; None означає «усі значення» виміру.
+
+    Рядки з порожнім значенням виміру не проходять жоден фільтр, зокрема «усі
+    значення», — як і вибір усіх значень списком, тож KPI, відділи, матриця й
+    динаміка рахуються з тих самих рядків. З index маска збирається з DimensionIndex (бітові маски й номери рядків) замість isin по рядках.
+    Масив int32 займає 4 байти на рядок проти повної копії рядків у зрізі.
+    """
+    if index is not None:
+        mask = index.mask(
+            Year=None if year is None else [year],
+            Month_Num=months,
+            Department=departments,
+            Type_of_expense=expense_types,
+        )
+    else:
+        mask = np.ones(len(cube), bool)
+        for col, values in (("Year", None if year is None else [year]), ("Month_Num", months),
+                            ("Department", departments), ("Type_of_expense", expense_types)):
+            if col not in cube.columns:
+                continue
+            sel = cube[col].notna() if values is None else cube[col].isin(values)
+            # Year і Month_Num бувають nullable (Int16/Int8): маска має бути numpy bool без NA.
+            mask &= sel.to_numpy(dtype=bool, na_value=False)
+    return np.flatnonzero(mask).astype(np.int32)
+
+
+def slice_cube(cube: pd.DataFrame, year=None, months=None,
+               departments=None, expense_types=None, index: DimensionIndex = None) -> pd.DataFrame:
+    """Рядки куба за фільтрами (копія); див. filter_rows."""
+    return cube.take(filter_rows(cube, year, months, departments, expense_types, index=index))
+
+
+def rollup(cube: pd.DataFrame, by: list, rows: np.ndarray = None, dropna: bool = True) -> pd.DataFrame:
+    """Пересумовує куб (або лише рядки rows з filter_rows) до розрізу by.
+
+    Куб не змінюється і не копіюється повністю: з рядків rows беруться тільки колонки by і Sum.
+    dropna=False залишає групи з порожніми значеннями by — потрібно, коли з
+    результату далі рахуються підсумки вищого рівня.
+    """
+    frame = cube[list(by) + ["Sum"]]
+    if rows is not None and len(rows) < len(cube):
+        frame = frame.take(rows)
+    return frame.groupby(by, observed=True, dropna=dropna)["Sum"].sum().reset_index()
+
+
+def filter_key(*parts) -> str:
+    """Компактний хеш стану фільтрів.
+
+    Списки нормалізуються у відсортовані кортежі, тож порядок кліків на ключ не впливає.
+    """
+    norm = tuple(
+        tuple(sorted(p)) if isinstance(p, (list, tuple, set, frozenset)) else p
+        for p in parts
+    )
+    return hashlib.blake2b(repr(norm).encode("utf-8"), digest_size=12).hexdigest()
+
+
+def _sizeof(value) -> int:
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, tuple):
+        return sys.getsizeof(value) + sum(_sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class FilterCache:
+    """Спільний для сесій LRU-кеш зрізів куба й агрегатів з обмеженням пам'яті.
+
+    Значення повертаються без копіювання, тому їх не можна змінювати на місці.
+    sizeof задає, як рахувати розмір значення для ліміту max_bytes; якщо задано
+    name, влучання й промахи потрапляють у лічильники perf як name.hit/name.miss.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 2**20, sizeof=_sizeof, name: str = ""):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute, size: int = None):
+        """Значення з кешу або compute(); size — готова оцінка розміру замість sizeof."""
+        with self._lock:
+            hit = key in self._items
+            if hit:
+                self._items.move_to_end(key)
+                self.hits += 1
+                value = self._items[key][0]
+            else:
+                self.misses += 1
+        if self.name:
+            perf.count(f"{self.name}.{'hit' if hit else 'miss'}")
+        if hit:
+            return value
+        value = compute()
+        if size is None:
+            size = self.sizeof(value)
+        with self._lock:
+            if key not in self._items and size <= self.max_bytes:
+                self._items[key] = (value, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, (_, old_size) = self._items.popitem(last=False)
+                    self._bytes -= old_size
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._items),
+                "bytes": self._bytes,
+            }
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Пам'ять на рядок і час groupby: типи load_data до і після compact_dtypes.
+
+Запуск: python benchmarks/bench_dtypes.py [кількість рядків ...]
+"""
+import os
+import sys
+
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from aggregates import UA_MONTHS, build_cube, compact_dtypes  # noqa: E402
+from synthetic import make_expenses  # noqa: E402
+from timing import best_of  # noqa: E402
+
+
+def legacy_frame(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Рядки так, як їх повертав load_data до compact_dtypes (з Month_Name у кожному рядку)."""
+    df = make_expenses(n_rows, seed=seed)
+    df["Year"] = df["Period"].dt.year
+    df["Month_Num"] = df["Period"].dt.month
+    df["Month_Name"] = df["Month_Num"].map(UA_MONTHS)
+    return df
+
+
+def bytes_per_row(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True, index=False).sum() / len(df)
+
+
+def main(sizes):
+    print(f"{'rows':>9} {'B/row old':>10} {'B/row new':>10} {'f32':>6} {'cube old s':>11} {'cube new s':>11}")
+    for n in sizes:
+        old = legacy_frame(n)
+        new = compact_dtypes(old.drop(columns="Month_Name"))
+        f32 = compact_dtypes(old.drop(columns="Month_Name"), float32=True)
+        t_old = best_of(lambda: build_cube(old), repeat=3)
+        t_new = best_of(lambda: build_cube(new), repeat=3)
+        print(f"{n:>9} {bytes_per_row(old):>10.0f} {bytes_per_row(new):>10.0f} {bytes_per_row(f32):>6.0f} "
+              f"{t_old:>11.3f} {t_new:>11.3f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [100_000, 1_000_000])
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Затримка фільтра: isin по рядкових колонках проти бітових масок DimensionIndex.
+
+Запуск: python benchmarks/bench_filter_index.py [кількість рядків ...]
+"""
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from aggregates import DimensionIndex, prepare_expenses, slice_cube  # noqa: E402
+from synthetic import make_expenses  # noqa: E402
+from timing import best_of, timed  # noqa: E402
+
+
+def main(sizes):
+    print(f"{'rows':>9} {'build s':>8} {'isin ms':>8} {'index ms':>9} {'speedup':>8}")
+    for n in sizes:
+        df = prepare_expenses(make_expenses(n))
+        filters = dict(
+            year=2024,
+            months=[1, 2, 3],
+            departments=[f"Відділ {i}" for i in range(3)],
+            expense_types=sorted(df["Type_of_expense"].unique())[::10],
+        )
+        index, build = timed(DimensionIndex, df)
+        assert slice_cube(df, **filters).equals(slice_cube(df, **filters, index=index))
+        t_isin = best_of(lambda: slice_cube(df, **filters))
+        t_index = best_of(lambda: slice_cube(df, **filters, index=index))
+        print(f"{n:>9} {build:>8.3f} {t_isin * 1e3:>8.2f} {t_index * 1e3:>9.2f} {t_isin / t_index:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
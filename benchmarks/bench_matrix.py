@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Побудова HTML-матриці витрат: попередній вкладений цикл проти matrix_renderer.
+
+Запуск: python benchmarks/bench_matrix.py [кількість статей ...]
+"""
+import os
+import re
+import sys
+
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from aggregates import build_cube, prepare_expenses, rollup  # noqa: E402
+from matrix_renderer import build_matrix, render_matrix  # noqa: E402
+from synthetic import make_expenses  # noqa: E402
+from timing import timed  # noqa: E402
+
+TYPES_PER_PARENT = 25
+ROWS_PER_TYPE = 20
+MATRIX_BY = ["Parent_Description", "Type_of_expense", "DistributionBase"]
+
+
+def legacy_rows_html(matrix_df: pd.DataFrame) -> str:
+    """Рядки матриці так, як їх будував streamlit_app.py до винесення в модуль."""
+    parent_grp, pivot_child, dist_types = build_matrix(matrix_df)
+    rows_html = ""
+    for idx, p_row in enumerate(parent_grp.itertuples(), start=1):
+        pname  = p_row.Parent_Description
+        psum   = p_row.Sum
+        grp_id = f"grp{idx}"
+        empty_tds = "".join('<td class="dist-col"></td>' for _ in dist_types)
+        rows_html += (
+            f'<tr class="parent-row" onclick="toggleGroup(\'{grp_id}\')" style="cursor:pointer;">'
+            f'<td><span class="toggle" id="btn_{grp_id}">&#8853;</span> {pname}</td>'
+            f'{empty_tds}'
+            f'<td>{psum:,.2f}</td></tr>'
+        )
+        children = pivot_child[pivot_child["Parent_Description"] == pname]
+        for _, c_row in children.sort_values("Всього", ascending=False).iterrows():
+            child_dist_tds = "".join(
+                f'<td class="dist-col">{c_row[dt]:,.2f}</td>' if c_row[dt] != 0
+                else '<td class="dist-col" style="color:#ccc">—</td>'
+                for dt in dist_types
+            )
+            rows_html += (
+                f'<tr class="child-row" data-group="{grp_id}" style="display:none;">'
+                f'<td style="padding-left:26px;">{c_row["Type_of_expense"]}</td>'
+                f'{child_dist_tds}'
+                f'<td>{c_row["Всього"]:,.2f}</td></tr>'
+            )
+    return rows_html
+
+
+def make_matrix_df(n_types: int, seed: int = 0) -> pd.DataFrame:
+    """Вхід матриці так, як його готує streamlit_app.py: rollup куба по MATRIX_BY.
+
+    Статті з довгого хвоста мають витрати не по всіх базах — у матриці це «—».
+    """
+    rows = make_expenses(n_types * ROWS_PER_TYPE, n_types=n_types,
+                         n_parents=max(1, n_types // TYPES_PER_PARENT), seed=seed)
+    return rollup(build_cube(prepare_expenses(rows)), MATRIX_BY, dropna=False)
+
+
+def main(sizes):
+    print(f"{'types':>7} {'legacy s':>9} {'renderer s':>11} {'µs/type':>8}")
+    for n in sizes:
+        df = make_matrix_df(n)
+        n = df["Type_of_expense"].nunique()
+        legacy, t_legacy = timed(legacy_rows_html, df)
+        (html, _), t_new = timed(render_matrix, df, df["Sum"].sum())
+        # Порядок статей з однаковою сумою може відрізнятися, тож порівнюємо набори рядків.
+        body = html.split('<tbody id="tbody">')[1].split('<tr class="total-row">')[0]
+        body = re.sub(r' id="row_grp\d+"', "", body)
+        assert sorted(legacy.split("</tr>")) == sorted(body.split("</tr>"))
+        print(f"{n:>7} {t_legacy:>9.3f} {t_new:>11.3f} {t_new / n * 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [500, 2_000, 8_000])
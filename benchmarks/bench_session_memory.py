@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Пам'ять на сесію: N одночасних сесій дашборду з різними фільтрами.
+
+Сесії запускаються через streamlit.testing (AppTest) в одному процесі на
+синтетичних даних замість Power BI й утримуються живими до кінця заміру.
+Приріст пам'яті (tracemalloc) на кожну наступну сесію має лишатися сталим
+і значно меншим за розмір куба.
+
+Запуск: python benchmarks/bench_session_memory.py [кількість сесій] [кількість рядків]
+"""
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import db_connection  # noqa: E402
+from synthetic import make_expenses  # noqa: E402
+
+
+def main(n_sessions: int, n_rows: int) -> None:
+    data = make_expenses(n_rows)
+    db_connection.get_expenses_data = lambda *a, **k: data.copy()
+    depts_all = sorted(data["Department"].unique())
+
+    from streamlit.testing.v1 import AppTest
+
+    rng = np.random.default_rng(1)
+    sessions = []
+    tracemalloc.start()
+    base = None
+    print(f"{'session':>7} {'run s':>6} {'total MB':>9} {'delta KB':>9}")
+    for i in range(n_sessions):
+        at = AppTest.from_file(os.path.join(ROOT, "streamlit_app.py"), default_timeout=120)
+        at.session_state["password_correct"] = True
+        depts = rng.choice(depts_all, 3, replace=False)
+        at.session_state["dept_list_0"] = {"selected": sorted(depts.tolist())}
+        t0 = time.perf_counter()
+        at.run()
+        # Перша сесія бачить каркас, поки сховище вантажить дані у фоні.
+        while not at.selectbox and not at.exception:
+            time.sleep(0.1)
+            at.run()
+        elapsed = time.perf_counter() - t0
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        sessions.append(at)
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+        delta = "" if base is None else f"{(current - base) / 1024:>9.0f}"
+        print(f"{i + 1:>7} {elapsed:>6.2f} {current / 2**20:>9.1f} {delta:>9}")
+        base = current
+    tracemalloc.stop()
+    print(f"вхідні рядки: {data.memory_usage(deep=True).sum() / 2**20:.1f} МБ")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 200_000)
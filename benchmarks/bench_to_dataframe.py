@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Порівняння _to_dataframe (через Arrow) з попередньою порядковою реалізацією.
+
+Запуск: python benchmarks/bench_to_dataframe.py [кількість рядків ...]
+"""
+import os
+import sys
+
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from db_connection import _to_dataframe, _typed  # noqa: E402
+from synthetic import execute_queries_payload, make_expenses  # noqa: E402
+from timing import traced  # noqa: E402
+
+
+def legacy_to_dataframe(result_json: dict) -> pd.DataFrame:
+    """Реалізація до векторизації: словник на рядок плюс ще один для clean()."""
+    results = result_json.get("results", [])
+    tables  = results[0].get("tables", []) if results else []
+    if not tables:
+        return pd.DataFrame()
+    table = tables[0]
+    cols  = [c.get("name") for c in table.get("columns", [])] if table.get("columns") else []
+    rows  = table.get("rows", []) or []
+    out = []
+    for row in rows:
+        if isinstance(row, dict):
+            out.append(row)
+        else:
+            out.append({cols[i]: row[i] for i in range(len(cols))})
+
+    def clean(k: str) -> str:
+        return k.split("[", 1)[-1].rstrip("]") if "[" in k else k
+
+    return pd.DataFrame([{clean(k): v for k, v in rec.items()} for rec in out])
+
+
+def main(sizes):
+    print(f"{'rows':>9} {'impl':<18} {'sec':>8} {'peak MB':>9}")
+    for n in sizes:
+        payload = execute_queries_payload(make_expenses(n))
+        expected = None
+        for name, fn, kwargs in (
+            ("legacy", legacy_to_dataframe, {}),
+            ("columnar", _to_dataframe, {}),
+            ("columnar+category", _to_dataframe, {"categorical": True}),
+        ):
+            df, elapsed, peak = traced(fn, payload, **kwargs)
+            if expected is None:
+                # _to_dataframe уже типізує Period і Sum (через Arrow), legacy — ні.
+                expected = _typed(df)
+            else:
+                pd.testing.assert_frame_equal(df.astype(object), expected.astype(object))
+            print(f"{n:>9} {name:<18} {elapsed:>8.3f} {peak / 2**20:>9.1f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000, 300_000])
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""Навантажувальний тест: багато одночасних сесій дашборду без браузера.
+
+Кожна сесія — окремий streamlit.testing AppTest, що програє сценарій
+користувача: вхід, зміна року, вибір відділів, пошук і вибір статей,
+перемикання вкладок, рух слайдера ТОП. Дані приходять із mock Power BI
+(mock_pbi.py), тож проходить увесь конвеєр застосунку, а кеші процесу
+(cache_resource, куб, FilterCache) спільні для всіх сесій, як на сервері.
+Пошук статей працює в браузері й перезапуску не викликає, тому в сценарії
+перезапуск дає вибір знайдених статей.
+
+AppTest на час перезапуску підміняє глобальні Runtime і st.secrets, тож два
+перезапуски в одному процесі не можуть іти одночасно: сесії працюють у своїх
+потоках, але перезапуски виконуються по черзі під одним замком. Час
+перезапуску рахується разом з очікуванням черги — так, як його бачить
+користувач; після прогріву перезапуски впираються в CPU, і черга близька до
+конкуренції за GIL в одному процесі Streamlit. --think задає паузу
+«користувача» між діями.
+
+Для кожної кількості сесій друкуються перцентилі часу перезапуску, пропускна
+здатність (перезапусків за секунду) і приріст RSS на сесію.
+
+Запуск: python benchmarks/load_test.py --sessions 1 5 10 20 --rows 100000
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from mock_pbi import MockPowerBI  # noqa: E402
+from synthetic import TABLE_NAME, make_expenses  # noqa: E402
+
+APP = os.path.join(ROOT, "streamlit_app.py")
+PASSWORD = "load-test"
+SEARCHES = ["позапланові", "стаття 1", "стаття 7"]
+TABS = ["📊  Витрати", "🏢  По відділах", "📈  Динаміка", "🔥  ТОП"]
+
+_run_lock = threading.Lock()
+
+
+def rss_mb() -> float:
+    """Поточний RSS процесу (Linux), інакше пік з getrusage."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Session:
+    """Одна сесія AppTest і часи її перезапусків у секундах."""
+
+    def __init__(self, seed: int, timeout: float, think: float = 0.0):
+        from streamlit.testing.v1 import AppTest
+        self.rng = random.Random(seed)
+        self.think = think
+        self.at = AppTest.from_file(APP, default_timeout=timeout)
+        self.at.secrets["password"] = PASSWORD
+        self.latencies = []
+
+    def _run(self, step: str) -> None:
+        t0 = time.perf_counter()
+        with _run_lock:
+            self.at.run()
+        self.latencies.append(time.perf_counter() - t0)
+        if self.at.exception:
+            raise RuntimeError(f"{step}: {self.at.exception[0].message}")
+
+    def login(self) -> None:
+        self._run("open")
+        self.at.text_input[0].input(PASSWORD)
+        self.at.button[0].click()
+        self._run("login")
+        # Поки дані вантажаться, сторінка показує каркас; браузер перепитує її через await_data.
+        while not any(e.key == "year_select" for e in self.at.selectbox):
+            time.sleep(0.5)
+            self._run("await data")
+
+    def scenario(self, steps: int, depts: list, expenses: list) -> None:
+        at = self.at
+        years = at.selectbox(key="year_select").options
+        for _ in range(steps):
+            if self.think:
+                time.sleep(self.rng.expovariate(1 / self.think))
+            action = self.rng.choice(["year", "depts", "search", "tab", "slider"])
+            if action == "year":
+                at.selectbox(key="year_select").select(self.rng.choice(years))
+            elif action == "depts":
+                at.session_state["dept_list_0"] = {"selected": self.rng.sample(depts, k=min(3, len(depts)))}
+            elif action == "search":
+                needle = self.rng.choice(SEARCHES)
+                found = [e for e in expenses if needle in e.lower()]
+                at.session_state["exp_list_0"] = {"selected": found[:10]}
+            elif action == "tab" or not at.slider:
+                at.session_state["active_tab"] = self.rng.choice(TABS)
+            else:
+                at.slider(key="top_slider").set_value(self.rng.randint(5, 30))
+            self._run(action)
+
+    def play(self, steps: int, depts: list, expenses: list) -> None:
+        self.login()
+        self.scenario(steps, depts, expenses)
+
+
+def run_level(n_sessions: int, args, depts: list, expenses: list) -> dict:
+    rss_before = rss_mb()
+    sessions = [Session(seed=i, timeout=args.timeout, think=args.think) for i in range(n_sessions)]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_sessions) as pool:
+        for f in [pool.submit(s.play, args.steps, depts, expenses) for s in sessions]:
+            f.result()
+    wall = time.perf_counter() - t0
+    rss_after = rss_mb()
+    latencies = np.array([x for s in sessions for x in s.latencies]) * 1000
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    return {
+        "sessions": n_sessions, "reruns": len(latencies),
+        "p50": p50, "p90": p90, "p99": p99, "max": latencies.max(),
+        "throughput": len(latencies) / wall,
+        "rss_per_session": (rss_after - rss_before) / n_sessions,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 10, 20])
+    parser.add_argument("--steps", type=int, default=15, help="дій на сесію після входу")
+    parser.add_argument("--think", type=float, default=0.0, help="середня пауза між діями, с")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--latency", type=float, default=0.05, help="затримка mock Power BI, с")
+    parser.add_argument("--timeout", type=float, default=300, help="ліміт одного перезапуску, с")
+    args = parser.parse_args()
+    # Попередження Streamlit, що повторюються в кожному перезапуску, засмічують звіт.
+    from streamlit import config, logger
+    config.set_option("logger.level", "error")
+    logger.set_log_level("error")
+
+    data = make_expenses(args.rows)
+    depts = sorted(data["Department"].unique())
+    expenses = sorted(data["Type_of_expense"].unique())
+
+    with MockPowerBI({TABLE_NAME: data}, latency=args.latency) as mock:
+        os.environ.update(mock.env())
+        os.environ["PBI_SNAPSHOT_DIR"] = ""
+        # Прогрів: перше завантаження даних і кешів процесу не входить у заміри.
+        Session(seed=-1, timeout=args.timeout).login()
+
+        print(f"{'sessions':>8} {'reruns':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+              f"{'max ms':>8} {'reruns/s':>9} {'MB/session':>11}")
+        for n in args.sessions:
+            r = run_level(n, args, depts, expenses)
+            print(f"{r['sessions']:>8} {r['reruns']:>7} {r['p50']:>8.0f} {r['p90']:>8.0f} {r['p99']:>8.0f} "
+                  f"{r['max']:>8.0f} {r['throughput']:>9.1f} {r['rss_per_session']:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""Локальна заміна Power BI: токен і executeQueries над синтетичними таблицями.
+
+Розуміє ті DAX-запити, які будує db_connection: повне вивантаження, FILTER за
+діапазоном Period або ISBLANK, SUMMARIZECOLUMNS із фільтрами року/місяців/Period,
+TREATAS і мірами "Sum" або "Rows" (COUNTROWS). Як і справжній API, відповідь
+мовчки обрізається на 100 000 рядках або 1 000 000 значень і стискається gzip,
+якщо клієнт його приймає. Щоб підключити застосунок, задайте
+PBI_TOKEN_URL=<url>/token і PBI_API_URL=<url>/v1.0/myorg.
+
+Запуск окремо: python benchmarks/mock_pbi.py [кількість рядків] [порт]
+"""
+import gzip
+import json
+import os
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import TABLE_NAME, make_expenses, to_rows  # noqa: E402
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+MAX_ROWS = 100_000
+MAX_VALUES = 1_000_000
+
+_DATE = r"DATE\((\d+), (\d+), (\d+)\)"
+_COL = r"'([^']+)'\[([^\]]+)\]"
+
+
+def _date(m) -> pd.Timestamp:
+    return pd.Timestamp(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+
+
+def _cap(df: pd.DataFrame) -> pd.DataFrame:
+    """Обрізає результат так само, як executeQueries."""
+    return df.head(min(MAX_ROWS, MAX_VALUES // max(1, df.shape[1])))
+
+
+def _period_filter(df: pd.DataFrame, dax: str) -> pd.DataFrame:
+    m = re.search(r"\[Period\] >= " + _DATE, dax)
+    if m:
+        df = df[df["Period"] >= _date(m)]
+    m = re.search(r"\[Period\] < " + _DATE, dax)
+    if m:
+        df = df[df["Period"] < _date(m)]
+    if "ISBLANK(" in dax:
+        df = df[df["Period"].isna()]
+    return df
+
+
+def _summarize(df: pd.DataFrame, table: str, dax: str) -> list:
+    body = dax[dax.index("SUMMARIZECOLUMNS(") + len("SUMMARIZECOLUMNS("):]
+    head = re.split(r'FILTER\(|TREATAS\(|"Sum"|"Rows"', body, maxsplit=1)[0]
+    group_by = [m.group(2) for m in re.finditer(_COL, head)]
+    df = _period_filter(df, dax)
+    m = re.search(r"YEAR\([^)]*\) = (\d+)", dax)
+    if m:
+        df = df[df["Period"].dt.year == int(m.group(1))]
+    m = re.search(r"MONTH\([^)]*\) IN \{([^}]*)\}", dax)
+    if m:
+        df = df[df["Period"].dt.month.isin([int(x) for x in m.group(1).split(",")])]
+    for m in re.finditer(r"TREATAS\(\{(.*?)\}, " + _COL + r"\)", dax):
+        values = [v.replace('""', '"') for v in re.findall(r'"((?:[^"]|"")*)"', m.group(1))]
+        df = df[df[m.group(3)].isin(values)]
+    if '"Rows"' in dax:
+        out = df.groupby(group_by, dropna=False).size().reset_index(name="[Rows]")
+    else:
+        out = df.groupby(group_by, dropna=False)["Sum"].sum().reset_index()
+        out = out.rename(columns={"Sum": "[Sum]"})
+    return to_rows(_cap(out), table)
+
+
+def evaluate(tables: dict, dax: str) -> list:
+    """Рядки результату DAX-запиту з підтримуваного підмножини."""
+    name = re.search(r"'([^']+)'", dax).group(1)
+    df = tables[name]
+    if "SUMMARIZECOLUMNS(" in dax:
+        return _summarize(df, name, dax)
+    if dax.startswith("EVALUATE FILTER("):
+        df = _period_filter(df, dax)
+    return to_rows(_cap(df), name)
+
+
+class MockPowerBI:
+    """HTTP-сервер у фоновому потоці; latency додає затримку до кожної відповіді."""
+
+    def __init__(self, tables: dict, latency: float = 0.0, port: int = 0):
+        self.tables = tables
+        self.latency = latency
+        self.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, name="mock-pbi", daemon=True)
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path.endswith("/token"):
+                    payload = {"access_token": "mock-token", "expires_in": 3600}
+                elif self.path.endswith("/executeQueries"):
+                    dax = json.loads(body)["queries"][0]["query"]
+                    mock.requests.append(dax)
+                    try:
+                        payload = {"results": [{"tables": [{"rows": evaluate(mock.tables, dax)}]}]}
+                    except (AttributeError, KeyError, ValueError) as e:
+                        return self._send(400, {"error": {"message": f"{type(e).__name__}: {e}"}})
+                else:
+                    return self._send(404, {"error": {"message": self.path}})
+                if mock.latency:
+                    time.sleep(mock.latency)
+                self._send(200, payload)
+
+            def _send(self, status: int, payload: dict):
+                data = orjson.dumps(payload) if orjson else json.dumps(payload).encode("utf-8")
+                gzipped = "gzip" in self.headers.get("Accept-Encoding", "")
+                if gzipped:
+                    data = gzip.compress(data, compresslevel=1)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                if gzipped:
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def env(self, dataset_id: str = "mock-dataset") -> dict:
+        """Змінні оточення, що спрямовують db_connection на цей сервер."""
+        return {
+            "PBI_TOKEN_URL": f"{self.url}/token",
+            "PBI_API_URL": f"{self.url}/v1.0/myorg",
+            "PBI_DATASET_ID": dataset_id,
+            "PBI_CLIENT_ID": "mock", "PBI_USERNAME": "mock", "PBI_PASSWORD": "mock",
+        }
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8765
+    with MockPowerBI({TABLE_NAME: make_expenses(n_rows)}, port=port) as mock:
+        for key, value in mock.env().items():
+            print(f"{key}={value}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
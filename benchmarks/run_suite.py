@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Офлайн-набір бенчмарків конвеєра дашборду на синтетичних даних і mock Power BI.
+
+Міряє час (медіана й мінімум із --repeat запусків) і пік пам'яті (tracemalloc,
+окремий запуск) для завантаження через get_expenses_data, розбору відповіді,
+підготовки куба, фільтра, агрегатів кожної вкладки та рендеру матриці.
+Результати дописуються в benchmarks/results/results.jsonl разом із комітом і
+параметрами, а --compare показує зміну відносно попереднього запуску з тими
+самими параметрами. Mock-сервер працює в тому ж процесі, тож пік пам'яті
+get_expenses_data включає й відповіді, які він серіалізує.
+
+Запуск: python benchmarks/run_suite.py --rows 100000 --repeat 5 --compare
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from mock_pbi import MockPowerBI  # noqa: E402
+from synthetic import TABLE_NAME, execute_queries_payload, make_expenses  # noqa: E402
+from timing import measure  # noqa: E402
+
+RESULTS = os.path.join(HERE, "results", "results.jsonl")
+
+
+def prepare(df: pd.DataFrame) -> pd.DataFrame:
+    """Те саме, що make_cube у streamlit_app.py (prepare_expenses змінює рядки на місці)."""
+    from aggregates import build_cube, prepare_expenses
+    return build_cube(prepare_expenses(df.copy()))
+
+
+def run(args) -> dict:
+    import db_connection
+    from aggregates import DimensionIndex, filter_rows, rollup
+    from matrix_renderer import render_matrix
+
+    data = make_expenses(args.rows, n_depts=args.depts, n_types=args.types, n_bases=args.bases)
+    results = {}
+
+    with MockPowerBI({TABLE_NAME: data}, latency=args.latency) as mock:
+        os.environ.update(mock.env())
+        os.environ["PBI_SNAPSHOT_DIR"] = ""
+
+        def cold():
+            db_connection._snapshot.clear()
+            db_connection._token_cache.clear()
+
+        results["get_expenses_data.full"] = measure(db_connection.get_expenses_data, args.repeat, setup=cold)
+        results["get_expenses_data.incremental"] = measure(db_connection.get_expenses_data, args.repeat)
+
+    payload = execute_queries_payload(data)
+    results["to_dataframe"] = measure(lambda: db_connection._to_dataframe(payload), args.repeat)
+    del payload
+
+    results["prepare_cube"] = measure(lambda: prepare(data), args.repeat)
+    cube = prepare(data)
+    results["dimension_index"] = measure(lambda: DimensionIndex(cube), args.repeat)
+    index = DimensionIndex(cube)
+
+    year = int(cube["Year"].max())
+    depts = sorted(cube["Department"].unique())[: max(1, args.depts // 4)]
+    types = sorted(cube["Type_of_expense"].unique())[::5]
+    results["filter_rows"] = measure(
+        lambda: filter_rows(cube, year, [1, 2, 3], depts, types, index=index), args.repeat)
+    rows = filter_rows(cube, year, None, None, None, index=index)
+
+    tabs = {
+        "tab.expenses.kpi": (["Type_of_expense"], rows),
+        "tab.expenses.matrix": (["Parent_Description", "Type_of_expense", "DistributionBase"], rows),
+        "tab.dept.summary": (["Department"], rows),
+        "tab.dept.detail": (["Department", "Parent_Description"], rows),
+        "tab.trends": (["Year", "Month_Num"], None),
+    }
+    for name, (by, sel) in tabs.items():
+        results[name] = measure(lambda: rollup(cube, by, rows=sel), args.repeat)
+    by_expense = rollup(cube, ["Type_of_expense"], rows=rows)
+    results["tab.top"] = measure(
+        lambda: by_expense.set_index("Type_of_expense")["Sum"].nlargest(15), args.repeat)
+
+    matrix_df = rollup(cube, tabs["tab.expenses.matrix"][0], rows=rows)
+    total = float(matrix_df["Sum"].sum())
+    results["matrix.render.lazy"] = measure(lambda: render_matrix(matrix_df, total, lazy=True), args.repeat)
+    results["matrix.render.full"] = measure(lambda: render_matrix(matrix_df, total), args.repeat)
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def previous_run(params: dict):
+    if not os.path.exists(RESULTS):
+        return None
+    last = None
+    with open(RESULTS, encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry.get("params") == params:
+                last = entry
+    return last
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--depts", type=int, default=12)
+    parser.add_argument("--types", type=int, default=200)
+    parser.add_argument("--bases", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0, help="затримка mock-сервера, с")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--compare", action="store_true", help="порівняти з попереднім запуском")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    params = {k: getattr(args, k) for k in ("rows", "depts", "types", "bases", "latency")}
+    before = previous_run(params) if args.compare else None
+    results = run(args)
+
+    print(f"{'benchmark':<32} {'median ms':>10} {'min ms':>9} {'peak MB':>8}" + ("   vs prev" if before else ""))
+    for name, r in results.items():
+        line = f"{name:<32} {r['median_ms']:>10.2f} {r['min_ms']:>9.2f} {r['peak_mb']:>8.1f}"
+        prev = (before or {}).get("results", {}).get(name)
+        if prev:
+            line += f"   {(r['median_ms'] / prev['median_ms'] - 1) * 100:+6.1f}%"
+        print(line)
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS), exist_ok=True)
+        entry = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "params": params,
+            "results": results,
+        }
+        with open(RESULTS, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        print(f"збережено в {os.path.relpath(RESULTS, ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Синтетична таблиця Operating_Expenses_SQL і відповіді executeQueries до неї.
+
+Розподіли наближені до реальних: статті мають різну «вагу» (кілька великих
+і довгий хвіст), суми — гамма-розподіл, частина статей позапланові.
+"""
+import numpy as np
+import pandas as pd
+
+TABLE_NAME = "Operating_Expenses_SQL"
+
+
+def make_expenses(n_rows: int, n_depts: int = 12, n_types: int = 200, n_bases: int = 4,
+                  n_parents: int = 15, start: str = "2022-01-01", n_months: int = 48,
+                  seed: int = 0) -> pd.DataFrame:
+    """Рядки у форматі get_expenses_data (Period, виміри, Sum)."""
+    rng = np.random.default_rng(seed)
+    type_weights = rng.pareto(1.5, n_types) + 1
+    types = rng.choice(n_types, n_rows, p=type_weights / type_weights.sum())
+    type_names = np.array([f"Стаття {i}" for i in range(n_types)], dtype=object)
+    type_names[::25] = [f"Позапланові витрати {i}" for i in range(len(type_names[::25]))]
+    periods = pd.date_range(start, periods=n_months, freq="MS")
+    return pd.DataFrame({
+        "Period": periods[rng.integers(0, n_months, n_rows)],
+        "Department": np.array([f"Відділ {i}" for i in range(n_depts)], dtype=object)[rng.integers(0, n_depts, n_rows)],
+        "Type_of_expense": type_names[types],
+        "Parent_Description": np.array([f"Категорія {i}" for i in range(n_parents)], dtype=object)[types % n_parents],
+        "DistributionBase": np.array([f"База {i}" for i in range(n_bases)], dtype=object)[rng.integers(0, n_bases, n_rows)],
+        "Sum": rng.gamma(2.0, 500.0, n_rows).round(2),
+    })
+
+
+def to_rows(df: pd.DataFrame, table: str = TABLE_NAME) -> list:
+    """Рядки відповіді executeQueries: ключі 'Table[Column]', дати як ISO-рядки, NaN як null."""
+    out = df.copy()
+    for c in out.columns:
+        if pd.api.types.is_datetime64_any_dtype(out[c]):
+            out[c] = out[c].dt.strftime("%Y-%m-%dT%H:%M:%S").astype(object)
+        out[c] = out[c].astype(object).where(out[c].notna(), None)
+    out.columns = [c if c.startswith("[") else f"{table}[{c}]" for c in out.columns]
+    return out.to_dict("records")
+
+
+def execute_queries_payload(df: pd.DataFrame, table: str = TABLE_NAME) -> dict:
+    """Повна відповідь executeQueries з одним результатом і однією таблицею."""
+    return {"results": [{"tables": [{"rows": to_rows(df, table)}]}]}
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""Спільні заміри часу й пам'яті для бенчмарків."""
+import statistics
+import time
+import tracemalloc
+
+
+def timed(fn, *args, **kwargs):
+    """Результат fn(*args, **kwargs) і час виконання в секундах."""
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - t0
+
+
+def traced(fn, *args, **kwargs):
+    """Як timed, але ще й пік пам'яті (tracemalloc) у байтах; tracemalloc уповільнює виклик."""
+    tracemalloc.start()
+    try:
+        out, elapsed = timed(fn, *args, **kwargs)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return out, elapsed, peak
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    """Найкращий із repeat запусків fn() у секундах."""
+    return min(timed(fn)[1] for _ in range(repeat))
+
+
+def measure(fn, repeat: int, setup=None) -> dict:
+    """Медіана й мінімум часу з repeat запусків (мс) і пік пам'яті окремого запуску (МБ).
+
+    setup() викликається перед кожним запуском і не входить у заміри.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        times.append(timed(fn)[1] * 1000)
+    if setup:
+        setup()
+    _, _, peak = traced(fn)
+    return {"median_ms": statistics.median(times), "min_ms": min(times), "peak_mb": peak / 2**20}
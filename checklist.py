@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""Віртуалізований список з прапорцями для фільтрів сайдбару.
+
+Замість окремого st.checkbox на кожне значення весь список — один елемент
+st.components.v2: у DOM є лише видиме вікно рядків, а пошук іде в браузері по
+заздалегідь приведених до нижнього регістру назвах, тож введення в пошук не
+перезапускає скрипт. У Python повертається лише множина обраних значень.
+"""
+import streamlit as st
+
+ROW_HEIGHT = 28
+
+_CSS = """
+.vc-search { box-sizing:border-box; width:100%; height:32px; margin-bottom:6px; padding:4px 10px;
+    border:1px solid #cdd5de; border-radius:8px; font-size:13px; font-family:inherit;
+    background:white; color:#111; outline:none; }
+.vc-search:focus { border-color:#0055a4; }
+.vc-viewport { position:relative; overflow-y:auto; border:1px solid #dde3ea; border-radius:8px;
+    background:white; }
+.vc-window { position:absolute; left:0; right:0; top:0; }
+.vc-row { display:flex; align-items:center; gap:8px; height:28px; padding:0 8px;
+    font-size:13px; color:#111; cursor:pointer; white-space:nowrap; overflow:hidden;
+    text-overflow:ellipsis; }
+.vc-row:hover { background:#f0f4f8; }
+.vc-row input { flex-shrink:0; width:16px; height:16px; margin:0; accent-color:#0055a4; cursor:pointer; }
+.vc-row span { overflow:hidden; text-overflow:ellipsis; }
+.vc-empty { padding:8px; font-size:12px; color:#888; }
+"""
+
+_JS = """
+const ROW = %(row)d;
+const OVERSCAN = 6;
+
+function mount(root, setStateValue) {
+    const search = document.createElement("input");
+    search.className = "vc-search";
+    const viewport = document.createElement("div");
+    viewport.className = "vc-viewport";
+    const spacer = document.createElement("div");
+    const win = document.createElement("div");
+    win.className = "vc-window";
+    viewport.append(spacer, win);
+    root.append(search, viewport);
+
+    const vc = { search, viewport, spacer, win, options: [], lower: [], shown: [],
+                 selected: new Set(), version: null, setStateValue };
+
+    search.addEventListener("input", () => {
+        const q = search.value.trim().toLowerCase();
+        vc.shown = [];
+        for (let i = 0; i < vc.lower.length; i++) {
+            if (!q || vc.lower[i].includes(q)) vc.shown.push(i);
+        }
+        viewport.scrollTop = 0;
+        render(vc);
+    });
+    viewport.addEventListener("scroll", () => render(vc));
+    win.addEventListener("change", (e) => {
+        const i = Number(e.target.dataset.i);
+        const name = vc.options[i];
+        if (e.target.checked) vc.selected.add(name); else vc.selected.delete(name);
+        vc.setStateValue("selected", Array.from(vc.selected));
+    });
+    return vc;
+}
+
+function render(vc) {
+    const total = vc.shown.length;
+    vc.spacer.style.height = (total * ROW) + "px";
+    if (!total) {
+        vc.win.innerHTML = '<div class="vc-empty">Нічого не знайдено</div>';
+        vc.win.style.transform = "";
+        return;
+    }
+    const first = Math.max(0, Math.floor(vc.viewport.scrollTop / ROW) - OVERSCAN);
+    const count = Math.ceil(vc.viewport.clientHeight / ROW) + 2 * OVERSCAN;
+    const last = Math.min(total, first + count);
+    const frag = document.createDocumentFragment();
+    for (let k = first; k < last; k++) {
+        const i = vc.shown[k];
+        const label = document.createElement("label");
+        label.className = "vc-row";
+        label.title = vc.options[i];
+        const box = document.createElement("input");
+        box.type = "checkbox";
+        box.dataset.i = i;
+        box.checked = vc.selected.has(vc.options[i]);
+        const text = document.createElement("span");
+        text.textContent = vc.options[i];
+        label.append(box, text);
+        frag.append(label);
+    }
+    vc.win.replaceChildren(frag);
+    vc.win.style.transform = "translateY(" + (first * ROW) + "px)";
+}
+
+export default function (component) {
+    const { data, parentElement, setStateValue } = component;
+    let vc = parentElement.__vc;
+    if (!vc) {
+        vc = parentElement.__vc = mount(parentElement, setStateValue);
+    }
+    vc.setStateValue = setStateValue;
+    vc.search.style.display = data.search ? "" : "none";
+    vc.search.placeholder = data.placeholder || "";
+    vc.viewport.style.height = data.height + "px";
+    if (vc.version !== data.version) {
+        vc.version = data.version;
+        vc.options = data.options;
+        vc.lower = data.options.map((s) => s.toLowerCase());
+        vc.search.dispatchEvent(new Event("input"));
+    }
+    vc.selected = new Set(data.selected);
+    render(vc);
+}
+""" % {"row": ROW_HEIGHT}
+
+_component = st.components.v2.component("virtual_checklist", css=_CSS, js=_JS)
+
+
+def checklist(options: list, key: str, search: bool = False, height: int = 165,
+              placeholder: str = "🔍 Пошук") -> set:
+    """Множина обраних значень з options.
+
+    Стан вибору зберігає сам компонент (за key); щоб скинути вибір, передайте новий key.
+    """
+    result = _component(
+        key=key,
+        data={
+            "options": options,
+            "version": f"{len(options)}:{hash(tuple(options))}",
+            "selected": sorted(st.session_state.get(key, {}).get("selected") or ()),
+            "search": search,
+            "placeholder": placeholder,
+            "height": height,
+        },
+        default={"selected": []},
+        on_selected_change=lambda: None,
+    )
+    return set(result.get("selected") or ()) & set(options)
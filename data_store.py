@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""Спільне для сесій сховище даних дашборду з фоновим оновленням.
+
+Дані перезавантажуються фоновим потоком за розкладом і підміняються одним
+присвоєнням, тож сесії завжди отримують останню готову версію без очікування
+(stale-while-revalidate). Одночасні запити на оновлення об'єднуються в одне.
+Поки перше завантаження триває, можна показати останній збережений знімок
+(stale) і не блокувати сторінку — current(wait=False).
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, NamedTuple, Optional
+
+import perf
+
+logger = logging.getLogger(__name__)
+
+
+class Loaded(NamedTuple):
+    data: Any
+    refreshed_at: float
+    duration: float
+    stale: bool = False
+
+
+class DataStore:
+    """Тримає результат load() і оновлює його кожні interval секунд.
+
+    Лише перше звернення чекає на завантаження; далі current() повертає
+    наявну версію, а помилка оновлення залишає попередню й пишеться в лог.
+    load(full_reload) отримує True, коли оновлення запросили повним (refresh(full=True)).
+    Якщо результат load має attrs (DataFrame) з refreshed_at і stale, версія
+    позначається ними, а не часом виклику — так завантажувач повідомляє, що
+    повернув збережений знімок.
+    stale() швидко повертає останній збережений знімок (Loaded зі stale=True)
+    або None; його показують, доки не завершиться перше завантаження.
+    """
+
+    def __init__(self, load: Callable[[bool], Any], interval: float = 1800,
+                 stale: Optional[Callable[[], Optional[Loaded]]] = None):
+        self._load = load
+        self._stale = stale
+        self.interval = interval
+        self.last_error = None
+        self._current = None
+        self._attempted_at = 0.0
+        self._inflight = None
+        self._inflight_full = False
+        self._full_pending = False
+        self._lock = threading.Lock()
+        self._stale_lock = threading.Lock()
+        self._attempted_stale = False
+        self._worker = None
+
+    def current(self, wait: bool = True) -> Optional[Loaded]:
+        """Остання версія даних.
+
+        Якщо даних ще немає, спершу пробує stale-знімок і запускає завантаження
+        у фоні. Без знімка wait=True чекає на завантаження (і кидає його
+        помилку), а wait=False одразу повертає None. Після невдалого першого
+        завантаження wait=False не повторює його — для цього є refresh().
+        """
+        if self._current is None:
+            self._load_stale()
+        if self._current is None:
+            if wait:
+                self.refresh()
+                if self._current is None:
+                    raise self.last_error
+            elif self.last_error is None:
+                self.refresh(wait=False)
+            return self._current
+        if self._current.stale and self.last_error is None:
+            self.refresh(wait=False)
+        self._start_worker()
+        return self._current
+
+    def refresh(self, wait: bool = True, full: bool = False) -> None:
+        """Оновлює дані; якщо оновлення вже йде, приєднується до нього.
+
+        full=True просить повне перезавантаження. Якщо саме йде звичайне
+        оновлення, повне запускається одразу після нього.
+        """
+        with self._lock:
+            done = self._inflight
+            owner = done is None
+            if owner:
+                done = self._inflight = threading.Event()
+                self._inflight_full = full
+            elif full and not self._inflight_full:
+                self._full_pending = True
+        if owner:
+            if wait:
+                self._reload(done, full)
+            else:
+                threading.Thread(target=self._reload, args=(done, full),
+                                 name="data-store-refresh", daemon=True).start()
+        elif wait:
+            done.wait()
+
+    @property
+    def refreshing(self) -> bool:
+        return self._inflight is not None
+
+    def _load_stale(self) -> None:
+        if self._stale is None:
+            return
+        # Знімок читають лише раз: далі його замінить свіже завантаження.
+        with self._stale_lock:
+            if self._current is not None or self._attempted_stale:
+                return
+            self._attempted_stale = True
+            try:
+                snapshot = self._stale()
+            except Exception:
+                logger.warning("Не вдалося прочитати збережений знімок", exc_info=True)
+                return
+        if snapshot is not None:
+            with self._lock:
+                if self._current is None:
+                    self._current = snapshot
+
+    def _reload(self, done: threading.Event, full: bool = False) -> None:
+        started = self._attempted_at = time.time()
+        try:
+            data = self._load(full_reload=full)
+            attrs = getattr(data, "attrs", {})
+            self._current = Loaded(data, attrs.get("refreshed_at", started), time.time() - started,
+                                   stale=attrs.get("stale", False))
+            perf.record("data.load", self._current.duration * 1000)
+            self.last_error = None
+        except Exception as e:
+            self.last_error = e
+            logger.warning("Оновлення даних не вдалося", exc_info=True)
+        finally:
+            with self._lock:
+                self._inflight = None
+                pending, self._full_pending = self._full_pending, False
+            done.set()
+        if pending:
+            self.refresh(wait=False, full=True)
+
+    def _start_worker(self) -> None:
+        with self._lock:
+            if self._worker is not None:
+                return
+            self._worker = threading.Thread(target=self._run, name="data-store-scheduler", daemon=True)
+        self._worker.start()
+
+    def _run(self) -> None:
+        # Відлік від останньої спроби, а не від успішного оновлення, щоб після помилки не повторювати щосекунди.
+        while True:
+            time.sleep(max(1.0, self._attempted_at + self.interval - time.time()))
+            self.refresh()
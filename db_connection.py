@@ -1,7 +1,55 @@
 # -*- coding: utf-8 -*-
+import functools
+import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional, Tuple
+
 import requests
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from requests.adapters import HTTPAdapter
+from urllib3 import exceptions as urllib3_exceptions
+from urllib3.util.retry import Retry
+
+import perf
+import snapshot_store
+
+try:
+    import ijson
+except ImportError:  # потоковий розбір необов'язковий
+    ijson = None
+
+logger = logging.getLogger(__name__)
+
+TABLE_NAME = "Operating_Expenses_SQL"
+# Ліміти однієї відповіді executeQueries: після них Power BI мовчки обрізає результат.
+PBI_MAX_ROWS = 100_000
+PBI_MAX_VALUES = 1_000_000
+PBI_MAX_BYTES = 15 * 2**20
+CATEGORICAL_COLUMNS = ("Department", "Type_of_expense", "Parent_Description", "DistributionBase")
+
+# Локальний знімок таблиці для інкрементального оновлення (спільний для процесу).
+_snapshot: dict = {}
+_snapshot_lock = threading.Lock()
+_refresh_thread = None
+
+# Кеш Bearer-токена (спільний для процесу).
+TOKEN_REFRESH_MARGIN = 300
+TOKEN_MIN_TTL = 60
+_token_cache: dict = {}
+_token_lock = threading.Lock()
+_token_refresh_thread = None
+
+# Спільна HTTP-сесія з пулом з'єднань і повторними спробами.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+_session = None
+_session_lock = threading.Lock()
+
+_DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".snapshot")
 
 
 def _get_secret(key: str, default: str = "") -> str:
@@ -16,13 +64,72 @@ def _get_secret(key: str, default: str = "") -> str:
     return os.environ.get(key, default)
 
 
-def _get_token() -> str:
+def get_int_secret(key: str, default: int) -> int:
+    """Читає цілочисельний параметр із секретів; при помилці повертає default."""
+    try:
+        return int(_get_secret(key, str(default)))
+    except ValueError:
+        return default
+
+
+def get_flag(key: str) -> bool:
+    """True, якщо параметр у секретах має значення 1/true/yes/on."""
+    return _get_secret(key).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _get_float_secret(key: str, default: float) -> float:
+    """Читає дробовий параметр із секретів; при помилці повертає default."""
+    try:
+        return float(_get_secret(key, str(default)))
+    except ValueError:
+        return default
+
+
+def _get_session() -> requests.Session:
+    """Повертає спільну для процесу requests.Session.
+
+    З'єднання з login.microsoftonline.com та api.powerbi.com тримаються відкритими
+    (keep-alive), а відповіді 429/5xx повторюються з експоненційною затримкою
+    PBI_HTTP_BACKOFF * 2**n з урахуванням заголовка Retry-After.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=get_int_secret("PBI_HTTP_RETRIES", 5),
+                backoff_factor=_get_float_secret("PBI_HTTP_BACKOFF", 0.5),
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=frozenset({"POST"}),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=get_int_secret("PBI_HTTP_POOL_SIZE", 10),
+                max_retries=retry,
+            )
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+    return _session
+
+
+def _timeout(read_default: float) -> tuple:
+    """(connect, read) таймаути з PBI_CONNECT_TIMEOUT і PBI_READ_TIMEOUT."""
+    return (
+        _get_float_secret("PBI_CONNECT_TIMEOUT", 10),
+        _get_float_secret("PBI_READ_TIMEOUT", read_default),
+    )
+
+
+def _request_token() -> dict:
     """Отримує Bearer-токен через ROPC (Resource Owner Password Credentials)."""
     client_id = _get_secret("PBI_CLIENT_ID")
     username  = _get_secret("PBI_USERNAME")
     password  = _get_secret("PBI_PASSWORD")
     scope     = "https://analysis.windows.net/powerbi/api"
-    token_url = "https://login.microsoftonline.com/common/oauth2/token"
+    token_url = _get_secret("PBI_TOKEN_URL", "https://login.microsoftonline.com/common/oauth2/token")
 
     if not all([client_id, username, password]):
         raise RuntimeError("Не задані PBI_CLIENT_ID, PBI_USERNAME або PBI_PASSWORD у секретах.")
@@ -34,16 +141,72 @@ def _get_token() -> str:
         "username": username,
         "password": password,
     }
-    r = requests.post(token_url, data=body,
-                      headers={"Content-Type": "application/x-www-form-urlencoded"},
-                      timeout=30)
+    r = _get_session().post(token_url, data=body,
+                            headers={"Content-Type": "application/x-www-form-urlencoded"},
+                            timeout=_timeout(30))
     r.raise_for_status()
-    return r.json()["access_token"]
+    data = r.json()
+    return {
+        "access_token": data["access_token"],
+        "expires_at": time.time() + int(data.get("expires_in", 3600)),
+    }
 
 
-def _exec_dax(token: str, dataset_id: str, dax: str) -> dict:
-    """Виконує DAX-запит до Power BI REST API."""
-    url = f"https://api.powerbi.com/v1.0/myorg/datasets/{dataset_id}/executeQueries"
+def _token_fresh(min_ttl: float) -> bool:
+    return time.time() < _token_cache.get("expires_at", 0) - min_ttl
+
+
+def _refresh_token_locked(min_ttl: float) -> None:
+    """Оновлює токен під _token_lock, якщо його ще не оновив інший потік."""
+    with _token_lock:
+        if not _token_fresh(min_ttl):
+            _token_cache.update(_request_token())
+
+
+def _refresh_token_in_background() -> None:
+    global _token_refresh_thread
+    if _token_refresh_thread is not None and _token_refresh_thread.is_alive():
+        return
+
+    def run():
+        try:
+            _refresh_token_locked(TOKEN_REFRESH_MARGIN)
+        except Exception:
+            logger.warning("Фонове оновлення токена Power BI не вдалося", exc_info=True)
+
+    _token_refresh_thread = threading.Thread(target=run, name="pbi-token-refresh", daemon=True)
+    _token_refresh_thread.start()
+
+
+@perf.timed("pbi.token")
+def _get_token() -> str:
+    """Повертає Bearer-токен із кешу процесу, оновлюючи його завчасно.
+
+    Токен використовується, поки до закінчення expires_in лишається більше
+    TOKEN_REFRESH_MARGIN секунд. У вікні між TOKEN_REFRESH_MARGIN і TOKEN_MIN_TTL
+    повертається чинний токен, а новий запитується у фоні. Коли токена немає
+    або він майже прострочений, потоки чекають на один спільний запит.
+    """
+    if _token_fresh(TOKEN_REFRESH_MARGIN):
+        return _token_cache["access_token"]
+    if _token_fresh(TOKEN_MIN_TTL):
+        _refresh_token_in_background()
+        return _token_cache["access_token"]
+    _refresh_token_locked(TOKEN_MIN_TTL)
+    return _token_cache["access_token"]
+
+
+def _invalidate_token(token: str) -> None:
+    """Скидає кешований токен, якщо Power BI його відхилив."""
+    with _token_lock:
+        if _token_cache.get("access_token") == token:
+            _token_cache["expires_at"] = 0
+
+
+def _post_dax(token: str, dataset_id: str, dax: str, stream: bool = False) -> requests.Response:
+    """Надсилає DAX-запит до Power BI REST API і повертає успішну відповідь."""
+    api_url = _get_secret("PBI_API_URL", "https://api.powerbi.com/v1.0/myorg").rstrip("/")
+    url = f"{api_url}/datasets/{dataset_id}/executeQueries"
     headers = {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json",
@@ -52,13 +215,144 @@ def _exec_dax(token: str, dataset_id: str, dax: str) -> dict:
         "queries": [{"query": dax}],
         "serializerSettings": {"includeNulls": True},
     }
-    r = requests.post(url, headers=headers, json=payload, timeout=60)
+    session = _get_session()
+    r = session.post(url, headers=headers, json=payload, timeout=_timeout(60), stream=stream)
+    if r.status_code == 401:
+        # Токен відкликано або він прострочився раніше за expires_in.
+        r.close()
+        _invalidate_token(token)
+        headers["Authorization"] = f"Bearer {_get_token()}"
+        r = session.post(url, headers=headers, json=payload, timeout=_timeout(60), stream=stream)
     r.raise_for_status()
-    return r.json()
+    return r
+
+
+def _exec_dax(token: str, dataset_id: str, dax: str) -> dict:
+    """Виконує DAX-запит до Power BI REST API."""
+    with perf.span("pbi.dax"):
+        r = _post_dax(token, dataset_id, dax)
+        perf.record("pbi.dax.bytes", len(r.content), unit="B")
+        return r.json()
 
 
-def _to_dataframe(result_json: dict) -> pd.DataFrame:
-    """Перетворює відповідь PBI API на DataFrame."""
+class _DecodedReader:
+    """Файлоподібна обгортка над r.raw для ijson: рахує розпаковані байти.
+
+    r.raw.tell() дає байти з мережі, тобто розмір стиснутої gzip відповіді, а
+    ліміт executeQueries стосується розпакованої. Помилки urllib3 під час
+    читання перетворюються на винятки requests, як у r.iter_content, щоб їх
+    ловили ті самі обробники, що й помилки запиту.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.n_bytes = 0
+
+    def read(self, size: int = -1) -> bytes:
+        try:
+            chunk = self.raw.read(size, decode_content=True)
+        except urllib3_exceptions.ProtocolError as e:
+            raise requests.exceptions.ChunkedEncodingError(e) from e
+        except urllib3_exceptions.DecodeError as e:
+            raise requests.exceptions.ContentDecodingError(e) from e
+        except urllib3_exceptions.ReadTimeoutError as e:
+            raise requests.exceptions.ConnectionError(e) from e
+        except urllib3_exceptions.SSLError as e:
+            raise requests.exceptions.SSLError(e) from e
+        self.n_bytes += len(chunk)
+        return chunk
+
+
+class _Truncated(RuntimeError):
+    """Відповідь executeQueries вперлася в ліміт рядків, значень або обсягу."""
+
+
+class _ColumnBuffer:
+    """Колонковий буфер, у який дописуються рядки відповіді executeQueries."""
+
+    def __init__(self):
+        self.columns: dict = {}
+        self._names: dict = {}
+        self.n_rows = 0
+
+    def append(self, row: dict) -> None:
+        for key, value in row.items():
+            name = self._names.get(key)
+            if name is None:
+                name = self._names[key] = _clean_column(key)
+                self.columns[name] = [None] * self.n_rows
+            self.columns[name].append(value)
+        self.n_rows += 1
+        if len(row) < len(self.columns):
+            for values in self.columns.values():
+                if len(values) < self.n_rows:
+                    values.append(None)
+
+    def to_frame(self) -> pd.DataFrame:
+        try:
+            return _arrow_frame(pa.table(self.columns))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            return pd.DataFrame(self.columns)
+
+
+def _exec_dax_stream(token: str, dataset_id: str, dax: str) -> pd.DataFrame:
+    """Виконує DAX-запит і розбирає рядки відповіді потоково.
+
+    З ijson рядки читаються з мережі по одному й одразу потрапляють у
+    _ColumnBuffer, тож у пам'яті не тримається ні сирий JSON, ні дерево словників.
+    Без ijson відповідь розбирається звичайним r.json().
+    """
+    buf = _ColumnBuffer()
+    with perf.span("pbi.dax_stream"), _post_dax(token, dataset_id, dax, stream=ijson is not None) as r:
+        if ijson is not None:
+            reader = _DecodedReader(r.raw)
+            rows = ijson.items(reader, "results.item.tables.item.rows.item", use_float=True)
+        else:
+            results = r.json().get("results", [])
+            tables = results[0].get("tables", []) if results else []
+            rows = (tables[0].get("rows") or []) if tables else []
+        for row in rows:
+            buf.append(row)
+        n_bytes = reader.n_bytes if ijson is not None else len(r.content)
+        perf.record("pbi.dax.bytes", n_bytes, unit="B")
+    n_values = buf.n_rows * max(1, len(buf.columns))
+    if buf.n_rows >= PBI_MAX_ROWS or n_values > PBI_MAX_VALUES - len(buf.columns) or n_bytes >= PBI_MAX_BYTES:
+        raise _Truncated(
+            f"Відповідь Power BI обрізана лімітом executeQueries "
+            f"({buf.n_rows} рядків, {n_values} значень, {n_bytes / 2**20:.1f} МБ).")
+    return buf.to_frame()
+
+
+def _clean_column(name: str) -> str:
+    """'Table[Column]' -> 'Column'."""
+    return name.split("[", 1)[-1].rstrip("]") if "[" in name else name
+
+
+def _arrow_frame(table: pa.Table) -> pd.DataFrame:
+    """Arrow-таблиця відповіді -> DataFrame; Period і Sum типізуються ще в Arrow.
+
+    Рядкові колонки одразу стають колонками str, без проміжних Python-об'єктів.
+    Значення, які Arrow не може привести (нестандартна дата, текст у Sum),
+    дають ArrowInvalid — тоді викликач повертається до розбору через pandas.
+    """
+    names = table.column_names
+    if "Period" in names and pa.types.is_string(table["Period"].type):
+        table = table.set_column(names.index("Period"), "Period",
+                                 pc.cast(table["Period"], pa.timestamp("us")))
+    if "Sum" in names and not pa.types.is_floating(table["Sum"].type):
+        table = table.set_column(names.index("Sum"), "Sum", pc.cast(table["Sum"], pa.float64()))
+    return table.to_pandas()
+
+
+@perf.timed("pbi.parse")
+def _to_dataframe(result_json: dict, categorical: bool = False) -> pd.DataFrame:
+    """Перетворює відповідь PBI API на DataFrame.
+
+    Рядки-словники переводяться в Arrow одним викликом і звідти в pandas
+    (див. _arrow_frame), а префікси 'Table[...]' знімаються один раз з назв
+    колонок. При categorical=True колонки CATEGORICAL_COLUMNS отримують тип
+    category.
+    """
     results = result_json.get("results", [])
     tables  = results[0].get("tables", []) if results else []
     if not tables:
@@ -66,38 +360,479 @@ def _to_dataframe(result_json: dict) -> pd.DataFrame:
     table = tables[0]
     cols  = [c.get("name") for c in table.get("columns", [])] if table.get("columns") else []
     rows  = table.get("rows", []) or []
-    out = []
-    for row in rows:
-        if isinstance(row, dict):
-            out.append(row)
-        else:
-            out.append({cols[i]: row[i] for i in range(len(cols))})
+    if rows and not isinstance(rows[0], dict):
+        df = pd.DataFrame(rows, columns=cols)
+        df.columns = [_clean_column(c) for c in df.columns]
+    else:
+        try:
+            table = pa.Table.from_pylist(rows)
+            df = _arrow_frame(table.rename_columns([_clean_column(c) for c in table.column_names]))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            df = pd.DataFrame(rows)
+            df.columns = [_clean_column(c) for c in df.columns]
+    if categorical:
+        for c in CATEGORICAL_COLUMNS:
+            if c in df.columns:
+                df[c] = df[c].astype("category")
+    return df
+
+
+def _typed(df: pd.DataFrame) -> pd.DataFrame:
+    """Приводить Sum і Period до числового та дати."""
+    if "Sum" in df.columns:
+        df["Sum"] = pd.to_numeric(df["Sum"], errors="coerce")
+    if "Period" in df.columns:
+        df["Period"] = pd.to_datetime(df["Period"], errors="coerce")
+    return df
+
+
+def _incremental_cutoff(watermark: pd.Timestamp) -> pd.Timestamp:
+    """Початок найранішого періоду, який перечитується при інкрементальному оновленні.
 
-    def clean(k: str) -> str:
-        return k.split("[", 1)[-1].rstrip("]") if "[" in k else k
+    Окрім місяця з водяним знаком перечитуються ще PBI_INCREMENTAL_LOOKBACK_MONTHS
+    попередніх місяців — там найчастіше з'являються коригування.
+    """
+    lookback = max(0, get_int_secret("PBI_INCREMENTAL_LOOKBACK_MONTHS", 1))
+    return watermark.to_period("M").to_timestamp() - pd.DateOffset(months=lookback)
 
-    return pd.DataFrame([{clean(k): v for k, v in rec.items()} for rec in out])
 
+def _dax_date(ts: pd.Timestamp) -> str:
+    return f"DATE({ts.year}, {ts.month}, {ts.day})"
+
+
+def _period_counts(token: str, dataset_id: str, since=None,
+                   table: str = TABLE_NAME, period: str = "Period") -> pd.Series:
+    """Кількість рядків таблиці на кожен день колонки period (NaT — порожня дата).
+
+    Точні лічильники, а не середнє на місяць: таблиця росте нерівномірно, і
+    вікно за середнім легко перевищує ліміт відповіді.
+    """
+    t = f"'{table}'"
+    period_filter = f"FILTER(ALL({t}[{period}]), {t}[{period}] >= {_dax_date(since)}), " if since is not None else ""
+    dax = f"EVALUATE SUMMARIZECOLUMNS({t}[{period}], {period_filter}\"Rows\", COUNTROWS({t}))"
+    df = _to_dataframe(_exec_dax(token, dataset_id, dax))
+    if df.empty:
+        return pd.Series(dtype="int64")
+    rows = pd.to_numeric(df["Rows"], errors="coerce").fillna(0).astype("int64")
+    days = pd.to_datetime(df[period], errors="coerce").dt.floor("D")
+    return rows.groupby(days, dropna=False).sum().sort_index()
+
+
+def _page_windows(counts: pd.Series, page_rows: int) -> list:
+    """Групує дні поспіль у вікна не більші за page_rows рядків (день більший — окремим вікном)."""
+    windows, current, size = [], [], 0
+    for day, n in counts.items():
+        if current and size + n > page_rows:
+            windows.append(current)
+            current, size = [], 0
+        current.append(day)
+        size += n
+    if current:
+        windows.append(current)
+    return windows
+
+
+def _window_dax(days: list, table: str = TABLE_NAME, period: str = "Period") -> str:
+    t = f"'{table}'"
+    end = days[-1] + pd.Timedelta(days=1)
+    return (f"EVALUATE FILTER({t}, {t}[{period}] >= {_dax_date(days[0])}"
+            f" && {t}[{period}] < {_dax_date(end)})")
+
+
+def _fetch_window(token: str, dataset_id: str, days: list, window_dax) -> list:
+    """Результат window_dax(days) для вікна днів; обрізану відповідь ділить навпіл і перезапитує."""
+    try:
+        return [_exec_dax_stream(token, dataset_id, window_dax(days))]
+    except _Truncated:
+        if len(days) == 1:
+            raise RuntimeError(
+                f"Результат за {days[0]:%d.%m.%Y} не вміщується в одну відповідь executeQueries.") from None
+        mid = len(days) // 2
+        return (_fetch_window(token, dataset_id, days[:mid], window_dax)
+                + _fetch_window(token, dataset_id, days[mid:], window_dax))
 
-def get_expenses_data() -> pd.DataFrame:
-    """Отримати таблицю Operating_Expenses_SQL з Power BI і повернути DataFrame."""
+
+def _run_pages(jobs) -> list:
+    """Виконує сторінки в PBI_PAGE_WORKERS потоках; кожна повертає список DataFrame."""
+    workers = max(1, get_int_secret("PBI_PAGE_WORKERS", 4))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pbi-page") as pool:
+        return [f for part in pool.map(lambda job: job(), jobs) for f in part]
+
+
+def _fetch_table(token: str, dataset_id: str, since=None,
+                 table: str = TABLE_NAME, period: str = "Period") -> pd.DataFrame:
+    """Завантажує таблицю (або її частину з period >= since) сторінками.
+
+    Спершу запитується кількість рядків на кожен день колонки дати period
+    (_period_counts). Якщо вся таблиця більша за PBI_PAGE_ROWS, дні групуються
+    у вікна до PBI_PAGE_ROWS рядків, а рядки з порожньою датою при повному
+    завантаженні йдуть окремим запитом. Відповідь, що вперлася в ліміти
+    executeQueries (рядки, значення, обсяг), не приймається: вікно ділиться
+    навпіл і перезапитується. Сторінки виконуються паралельно в
+    PBI_PAGE_WORKERS потоках і склеюються в порядку дати.
+    """
+    t = f"'{table}'"
+    counts = _period_counts(token, dataset_id, since, table, period)
+    days = [d for d in counts.index if not pd.isna(d)]
+    page_rows = get_int_secret("PBI_PAGE_ROWS", 50_000)
+
+    frames = None
+    if counts.sum() <= page_rows:
+        whole = (f"EVALUATE {t}" if since is None
+                 else f"EVALUATE FILTER({t}, {t}[{period}] >= {_dax_date(since)})")
+        try:
+            frames = [_exec_dax_stream(token, dataset_id, whole)]
+        except _Truncated:
+            # Рядків небагато, але вони широкі — ділимо за днями, як і великі таблиці.
+            pass
+    if frames is None:
+        windows = _page_windows(counts[counts.index.notna()], page_rows) if days else []
+        window_dax = functools.partial(_window_dax, table=table, period=period)
+        jobs = [lambda w=w: _fetch_window(token, dataset_id, w, window_dax) for w in windows]
+        if since is None:
+            blank = f"EVALUATE FILTER({t}, ISBLANK({t}[{period}]))"
+            jobs.append(lambda: [_exec_dax_stream(token, dataset_id, blank)])
+        frames = _run_pages(jobs)
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    return _typed(df)
+
+
+def _fetch_full(token: str, dataset_id: str) -> pd.DataFrame:
+    """Повне вивантаження таблиці."""
+    return _fetch_table(token, dataset_id)
+
+
+def _fetch_since(token: str, dataset_id: str, cutoff: pd.Timestamp) -> pd.DataFrame:
+    """Рядки таблиці з Period >= cutoff."""
+    return _fetch_table(token, dataset_id, since=cutoff)
+
+
+def _snapshot_path(dataset_id: str) -> str:
+    """Шлях до файлового знімка; порожній PBI_SNAPSHOT_DIR вимикає запис на диск."""
+    folder = _get_secret("PBI_SNAPSHOT_DIR", _DEFAULT_SNAPSHOT_DIR)
+    return os.path.join(folder, f"{dataset_id}.arrow") if folder else ""
+
+
+def _set_snapshot(dataset_id: str, df: pd.DataFrame, refreshed_at: float, full_at: float) -> None:
+    _snapshot.update(
+        dataset_id=dataset_id,
+        df=df,
+        columns=list(df.columns),
+        watermark=df["Period"].max() if "Period" in df.columns else pd.NaT,
+        refreshed_at=refreshed_at,
+        full_at=full_at,
+    )
+
+
+def _store_snapshot(dataset_id: str, df: pd.DataFrame, full: bool) -> None:
+    now = time.time()
+    _set_snapshot(dataset_id, df, now, now if full else _snapshot.get("full_at", now))
+    path = _snapshot_path(dataset_id)
+    if path:
+        try:
+            snapshot_store.save_snapshot(path, df, dataset_id, fetched_at=now, full_at=_snapshot["full_at"])
+        except OSError:
+            logger.warning("Не вдалося записати знімок %s", path, exc_info=True)
+
+
+def _restore_snapshot(dataset_id: str) -> bool:
+    """Піднімає знімок із диска, якщо в пам'яті процесу його ще немає."""
+    path = _snapshot_path(dataset_id)
+    loaded = snapshot_store.load_snapshot(path, dataset_id) if path else None
+    if loaded is None:
+        return False
+    df, meta = loaded
+    _set_snapshot(dataset_id, df, meta["fetched_at"], meta.get("full_at", meta["fetched_at"]))
+    return True
+
+
+def _refresh_in_background() -> None:
+    """Запускає одне фонове оновлення знімка, якщо воно ще не виконується."""
+    global _refresh_thread
+    if _refresh_thread is not None and _refresh_thread.is_alive():
+        return
+
+    def run():
+        try:
+            with _snapshot_lock:
+                _refresh_snapshot(_snapshot["dataset_id"], full_reload=False)
+        except Exception:
+            logger.warning("Фонове оновлення даних Power BI не вдалося", exc_info=True)
+
+    _refresh_thread = threading.Thread(target=run, name="pbi-snapshot-refresh", daemon=True)
+    _refresh_thread.start()
+
+
+def _needs_full_reload(dataset_id: str) -> bool:
+    if _snapshot.get("dataset_id") != dataset_id or pd.isna(_snapshot.get("watermark", pd.NaT)):
+        return True
+    max_age = get_int_secret("PBI_FULL_RELOAD_HOURS", 24) * 3600
+    return time.time() - _snapshot["full_at"] >= max_age
+
+
+def _refresh_snapshot(dataset_id: str, full_reload: bool) -> pd.DataFrame:
+    """Оновлює знімок із Power BI (повністю або інкрементально); викликати під _snapshot_lock."""
+    token = _get_token()
+
+    if full_reload or _needs_full_reload(dataset_id):
+        df = _fetch_full(token, dataset_id)
+        _store_snapshot(dataset_id, df, full=True)
+        return df
+
+    cutoff = _incremental_cutoff(_snapshot["watermark"])
+    delta = _fetch_since(token, dataset_id, cutoff)
+    if not delta.empty and list(delta.columns) != _snapshot["columns"]:
+        # Схема таблиці змінилась — знімок більше не сумісний.
+        df = _fetch_full(token, dataset_id)
+        _store_snapshot(dataset_id, df, full=True)
+        return df
+
+    base = _snapshot["df"]
+    keep = base[~(base["Period"] >= cutoff)]
+    if delta.empty:
+        df = keep.reset_index(drop=True)
+    else:
+        df = pd.concat([keep, delta], ignore_index=True)
+    _store_snapshot(dataset_id, df, full=False)
+    return df
+
+
+def get_expenses_data(full_reload: bool = False, fallback: bool = True) -> pd.DataFrame:
+    """Отримати таблицю Operating_Expenses_SQL з Power BI і повернути DataFrame.
+
+    Після першого повного завантаження тримає локальний знімок і при наступних
+    викликах перечитує лише періоди, починаючи з останнього наявного місяця
+    (див. _incremental_cutoff), замінюючи ними відповідні рядки знімка.
+    Повне перечитування виконується при full_reload=True, зміні набору колонок,
+    іншому PBI_DATASET_ID або коли знімку більше PBI_FULL_RELOAD_HOURS годин.
+
+    Знімок також зберігається на диск (PBI_SNAPSHOT_DIR). Після перезапуску процесу
+    функція одразу повертає файловий знімок, а оновлення з Power BI виконує у фоні.
+    Якщо Power BI недоступний або обмежує запити навіть після повторних спроб,
+    повертається наявний знімок, а помилка пишеться в лог; fallback=False натомість
+    піднімає помилку (DataStore сам тримає попередню версію й показує помилку).
+
+    attrs["refreshed_at"] результату — час, коли дані отримано з Power BI, а
+    attrs["stale"] — True, якщо це збережений знімок, а не результат цього виклику.
+    """
     dataset_id = _get_secret("PBI_DATASET_ID")
     if not dataset_id:
         raise RuntimeError("Не задано PBI_DATASET_ID у секретах.")
 
-    token = _get_token()
+    # Лок об'єднує одночасні оновлення з різних сесій в одне звернення до Power BI.
+    with _snapshot_lock:
+        if (not full_reload and _snapshot.get("dataset_id") != dataset_id
+                and _restore_snapshot(dataset_id)):
+            _refresh_in_background()
+            return _with_freshness(_snapshot["df"], stale=True)
+
+        try:
+            df = _refresh_snapshot(dataset_id, full_reload)
+        except requests.RequestException:
+            if not fallback or _snapshot.get("dataset_id") != dataset_id:
+                raise
+            logger.warning("Power BI недоступний, повертаю знімок від %s",
+                           time.ctime(_snapshot["refreshed_at"]), exc_info=True)
+            return _with_freshness(_snapshot["df"], stale=True)
+        return _with_freshness(df, stale=False)
+
+
+def _with_freshness(df: pd.DataFrame, stale: bool) -> pd.DataFrame:
+    """Копія df з часом оновлення знімка в attrs; викликати під _snapshot_lock."""
+    df = df.copy()
+    df.attrs.update(refreshed_at=_snapshot["refreshed_at"], stale=stale)
+    return df
+
 
-    dax = "EVALUATE 'Operating_Expenses_SQL'"
-    result = _exec_dax(token, dataset_id, dax)
-    df = _to_dataframe(result)
+def peek_expenses_data() -> Optional[Tuple[pd.DataFrame, float]]:
+    """Наявний знімок таблиці (з пам'яті або диска) і час його оновлення, без звернення до Power BI.
 
+    Повертає None, якщо знімка немає або його саме оновлює інший потік. Піднятий
+    з диска знімок лишається в пам'яті, тож наступний get_expenses_data
+    дочитує лише нові періоди.
+    """
+    dataset_id = _get_secret("PBI_DATASET_ID")
+    if not dataset_id or not _snapshot_lock.acquire(blocking=False):
+        return None
+    try:
+        if _snapshot.get("dataset_id") != dataset_id and not _restore_snapshot(dataset_id):
+            return None
+        return _snapshot["df"].copy(), _snapshot["refreshed_at"]
+    finally:
+        _snapshot_lock.release()
+
+
+def _dax_str(value) -> str:
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def build_summarize_dax(group_by, year=None, months=None,
+                        departments=None, expense_types=None,
+                        period_from=None, period_to=None, blank_period=False) -> str:
+    """Будує SUMMARIZECOLUMNS-запит із сумою Sum у розрізі group_by.
+
+    Year і Month_Num у таблиці не зберігаються, тому групування по них іде через
+    Period (див. get_expenses_aggregate), а фільтр по року/місяцях — через
+    FILTER над значеннями Period. Порожній або None фільтр означає «усі значення».
+    period_from/period_to (включно/не включно) і blank_period обмежують запит
+    вікном дат або рядками з порожнім Period — так агрегат ділиться на сторінки.
+    """
+    t = f"'{TABLE_NAME}'"
+    columns = []
+    for col in group_by:
+        col = "Period" if col in ("Year", "Month_Num") else col
+        if f"{t}[{col}]" not in columns:
+            columns.append(f"{t}[{col}]")
+
+    filters = []
+    conds = []
+    if year is not None:
+        conds.append(f"YEAR({t}[Period]) = {int(year)}")
+    if months:
+        conds.append(f"MONTH({t}[Period]) IN {{{', '.join(str(int(m)) for m in months)}}}")
+    if period_from is not None:
+        conds.append(f"{t}[Period] >= {_dax_date(period_from)}")
+    if period_to is not None:
+        conds.append(f"{t}[Period] < {_dax_date(period_to)}")
+    if blank_period:
+        conds.append(f"ISBLANK({t}[Period])")
+    if conds:
+        filters.append(f"FILTER(ALL({t}[Period]), {' && '.join(conds)})")
+    for col, values in (("Department", departments), ("Type_of_expense", expense_types)):
+        if values:
+            filters.append(f"TREATAS({{{', '.join(_dax_str(v) for v in values)}}}, {t}[{col}])")
+
+    args = columns + filters + [f'"Sum", SUM({t}[Sum])']
+    return f"EVALUATE SUMMARIZECOLUMNS({', '.join(args)})"
+
+
+def _fetch_aggregate_pages(token: str, dataset_id: str, group_by, year, months,
+                           departments, expense_types) -> pd.DataFrame:
+    """Агрегат, що не вмістився в одну відповідь, — вікнами за днями Period.
+
+    Груп у вікні не більше, ніж рядків таблиці в ньому, тож вікна будуються з
+    _period_counts так само, як у _fetch_table, а обрізане вікно ділиться навпіл.
+    Без фільтра за роком і місяцями окремо запитуються рядки з порожнім Period.
+    """
+    counts = _period_counts(token, dataset_id)
+    month_set = {int(m) for m in months} if months else None
+    days = [d for d in counts.index if not pd.isna(d)
+            and (year is None or d.year == int(year)) and (month_set is None or d.month in month_set)]
+    windows = _page_windows(counts.loc[days], get_int_secret("PBI_PAGE_ROWS", 50_000)) if days else []
+
+    def window_dax(w: list) -> str:
+        return build_summarize_dax(group_by, year, months, departments, expense_types,
+                                   period_from=w[0], period_to=w[-1] + pd.Timedelta(days=1))
+
+    jobs = [lambda w=w: _fetch_window(token, dataset_id, w, window_dax) for w in windows]
+    if year is None and not months:
+        blank = build_summarize_dax(group_by, departments=departments,
+                                    expense_types=expense_types, blank_period=True)
+        jobs.append(lambda: [_exec_dax_stream(token, dataset_id, blank)])
+    frames = [f for f in _run_pages(jobs) if not f.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def get_expenses_aggregate(group_by, year=None, months=None,
+                           departments=None, expense_types=None) -> pd.DataFrame:
+    """Агреговані на боці Power BI суми Operating_Expenses_SQL.
+
+    Повертає DataFrame з колонками group_by + ["Sum"]; group_by може містити
+    колонки таблиці, а також Year і Month_Num, похідні від Period. Якщо
+    результат упирається в ліміти executeQueries, він довантажується
+    сторінками за Period (_fetch_aggregate_pages), а не обрізається мовчки.
+    """
+    dataset_id = _get_secret("PBI_DATASET_ID")
+    if not dataset_id:
+        raise RuntimeError("Не задано PBI_DATASET_ID у секретах.")
+
+    group_by = list(group_by)
+    token = _get_token()
+    dax = build_summarize_dax(group_by, year, months, departments, expense_types)
+    try:
+        df = _exec_dax_stream(token, dataset_id, dax)
+    except _Truncated:
+        logger.info("Агрегат %s не вмістився в одну відповідь, вантажу сторінками", group_by)
+        df = _fetch_aggregate_pages(token, dataset_id, group_by, year, months, departments, expense_types)
+    df = _typed(df)
     if df.empty:
-        return df
+        return pd.DataFrame(columns=group_by + ["Sum"])
 
-    # Типізація
-    if "Sum" in df.columns:
-        df["Sum"] = pd.to_numeric(df["Sum"], errors="coerce")
-    if "Period" in df.columns:
-        df["Period"] = pd.to_datetime(df["Period"], errors="coerce")
+    if "Year" in group_by:
+        df["Year"] = df["Period"].dt.year
+    if "Month_Num" in group_by:
+        df["Month_Num"] = df["Period"].dt.month
+    if "Period" not in group_by:
+        # Period потрібен був лише для Year/Month_Num, а сторінки можуть повторювати
+        # групи — згортаємо до запитаної деталізації.
+        df = df.groupby(group_by, dropna=False, observed=True)["Sum"].sum().reset_index()
+    return df[group_by + ["Sum"]]
 
-    return df
+
+class QuerySpec(NamedTuple):
+    """Іменований DAX-запит; порожній dataset_id означає PBI_DATASET_ID.
+
+    Якщо задано table, таблиця вивантажується сторінками за колонкою дати
+    period (як Operating_Expenses_SQL у get_expenses_data), а dax не виконується.
+    """
+    name: str
+    dax: str
+    dataset_id: str = ""
+    table: str = ""
+    period: str = "Period"
+
+
+def table_query(name: str, table: str, dataset_id: str = "", period: str = "Period") -> QuerySpec:
+    """QuerySpec на повне вивантаження таблиці table сторінками за колонкою дати period."""
+    return QuerySpec(name, f"EVALUATE '{table}'", dataset_id, table, period)
+
+
+def run_queries(specs) -> dict:
+    """Виконує кілька DAX-запитів паралельно і повертає {name: DataFrame}.
+
+    Запити можуть іти до різних датасетів; усі використовують один токен із
+    _get_token, а відкликаний токен оновлюється в _post_dax. Потоків не більше
+    за PBI_QUERY_WORKERS, тож час завантаження визначає найдовший запит, а не їх сума.
+    Кожен DataFrame має attrs["dataset_id"], attrs["elapsed"] (секунди) і
+    attrs["rows"]. Помилка будь-якого запиту піднімається після завершення решти.
+
+    Запити з table (table_query) проходять через посторінкове _fetch_table і не
+    обмежені розміром однієї відповіді. Довільний DAX виконується одним
+    запитом, тож його результат має вкладатися в ліміти executeQueries
+    (PBI_MAX_ROWS рядків, PBI_MAX_VALUES значень, PBI_MAX_BYTES); обрізана
+    відповідь дає RuntimeError, а не неповні дані.
+    """
+    specs = [QuerySpec(*s) for s in specs]
+    names = [s.name for s in specs]
+    if len(set(names)) != len(names):
+        raise ValueError("Назви запитів мають бути унікальними.")
+    default_dataset = _get_secret("PBI_DATASET_ID")
+    if any(not (s.dataset_id or default_dataset) for s in specs):
+        raise RuntimeError("Не задано PBI_DATASET_ID у секретах.")
+    if not specs:
+        return {}
+    token = _get_token()
+
+    def run(spec: QuerySpec) -> pd.DataFrame:
+        dataset_id = spec.dataset_id or default_dataset
+        started = time.perf_counter()
+        if spec.table:
+            df = _fetch_table(token, dataset_id, table=spec.table, period=spec.period)
+        else:
+            try:
+                df = _typed(_exec_dax_stream(token, dataset_id, spec.dax))
+            except _Truncated as e:
+                raise RuntimeError(
+                    f"Запит {spec.name}: {e} Розбийте запит на частини або, якщо це вся таблиця, "
+                    f"використайте table_query.") from None
+        df.attrs.update(dataset_id=dataset_id, elapsed=time.perf_counter() - started, rows=len(df))
+        logger.info("DAX %s: %d рядків за %.2f с", spec.name, len(df), df.attrs["elapsed"])
+        return df
+
+    workers = max(1, min(len(specs), get_int_secret("PBI_QUERY_WORKERS", 8)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pbi-query") as pool:
+        futures = {s.name: pool.submit(run, s) for s in specs}
+    return {name: f.result() for name, f in futures.items()}
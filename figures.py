@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""Графіки Plotly для вкладок дашборду з кешем готових фігур.
+
+Фігура залежить лише від агрегату, з якого вона будується, і параметрів
+оформлення, тож ключем кешу є хеш вмісту агрегату разом із цими параметрами.
+Перемикання вкладок чи рух слайдера з тим самим агрегатом повертають уже
+побудовану фігуру.
+"""
+import hashlib
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+
+import perf
+from aggregates import FilterCache
+
+try:
+    import orjson  # noqa: F401
+    # st.plotly_chart серіалізує фігуру через plotly.io.to_json — з orjson це в рази швидше.
+    pio.json.config.default_engine = "orjson"
+except ImportError:  # швидка серіалізація необов'язкова
+    orjson = None
+
+YEAR_COLORS = {
+    "2022": "#1f77b4", "2023": "#ff7f0e", "2024": "#d62728",
+    "2025": "#9467bd", "2026": "#17becf",
+}
+
+
+def hex_to_rgba(hex_color: str, alpha: float = 0.10) -> str:
+    """Convert '#rrggbb' to 'rgba(r,g,b,alpha)'."""
+    h = hex_color.lstrip('#')
+    r, g, b = int(h[0:2], 16), int(h[2:4], 16), int(h[4:6], 16)
+    return f"rgba({r},{g},{b},{alpha})"
+
+
+def frame_hash(df: pd.DataFrame) -> str:
+    """Хеш вмісту DataFrame разом з індексом і назвами колонок."""
+    h = hashlib.blake2b(digest_size=12)
+    h.update(repr(list(df.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return h.hexdigest()
+
+
+# Макет і шаблон оформлення фігури в JSON займають кілька КБ незалежно від даних.
+SPEC_OVERHEAD = 16 * 2**10
+
+
+def _spec_size(df: pd.DataFrame) -> int:
+    """Оцінка розміру JSON-специфікації фігури з агрегату df.
+
+    Точний розмір (pio.to_json) означав би ще одну повну серіалізацію на кожен
+    промах кешу, крім тієї, що робить st.plotly_chart.
+    """
+    return int(df.memory_usage(deep=True, index=True).sum()) + SPEC_OVERHEAD
+
+
+class FigureCache(FilterCache):
+    """LRU-кеш фігур, обмежений оцінкою розміру їх JSON-специфікацій (_spec_size).
+
+    Фігури спільні для сесій і лише читаються: st.plotly_chart робить з них
+    to_dict() без повторної валідації.
+    """
+
+    def __init__(self, max_bytes: int = 16 * 2**20, name: str = ""):
+        super().__init__(max_bytes=max_bytes, name=name)
+
+    def figure(self, build, df: pd.DataFrame, **params) -> go.Figure:
+        """Фігура build(df, **params) з кешу; ключ — хеш df і params."""
+        key = (build.__name__, frame_hash(df), tuple(sorted(params.items())))
+
+        def compute() -> go.Figure:
+            with perf.span(f"figure.build.{build.__name__}"):
+                return build(df, **params)
+
+        return self.get_or_compute(key, compute, size=_spec_size(df))
+
+
+def dept_bar(dept_sum: pd.DataFrame) -> go.Figure:
+    fig = go.Figure(go.Bar(
+        x=dept_sum["Sum"], y=dept_sum["Department"],
+        orientation="h",
+        marker=dict(
+            color=dept_sum["Sum"],
+            colorscale=[[0, "#aac4de"], [0.5, "#2471a3"], [1, "#0a2342"]],
+            showscale=False,
+        ),
+        text=[f"{v/1000:,.1f} тис. ({p:.1f}%)"
+              for v, p in zip(dept_sum["Sum"], dept_sum["Pct"])],
+        textposition="outside",
+        hovertemplate="<b>%{y}</b><br>%{x:,.0f}<extra></extra>",
+    ))
+    fig.update_layout(
+        height=max(280, len(dept_sum) * 42 + 60),
+        margin=dict(l=0, r=120, t=10, b=10),
+        xaxis=dict(tickformat=",.0f", gridcolor="#eef2f7", title=""),
+        yaxis=dict(autorange="reversed", title=""),
+        plot_bgcolor="white", paper_bgcolor="white",
+    )
+    return fig
+
+
+def dept_pie(dept_sum: pd.DataFrame, total: float) -> go.Figure:
+    fig = px.pie(
+        dept_sum, names="Department", values="Sum", hole=0.5,
+        color_discrete_sequence=px.colors.sequential.Blues_r,
+    )
+    fig.update_traces(
+        textposition="outside", textinfo="percent+label",
+        hovertemplate="<b>%{label}</b><br>%{value:,.0f}<extra></extra>",
+    )
+    fig.update_layout(
+        height=360, margin=dict(l=0, r=0, t=20, b=20),
+        showlegend=False, paper_bgcolor="white",
+        annotations=[dict(
+            text=f"{total/1000:,.0f}<br>тис.",
+            x=0.5, y=0.5, showarrow=False,
+            font=dict(size=14, color="#1a5276", family="Segoe UI"),
+        )],
+    )
+    return fig
+
+
+def trend_line(ym: pd.DataFrame) -> go.Figure:
+    """Лінії по роках; ym — Year (str), Month_Num, Month_Name, Sum."""
+    fig = go.Figure()
+    for yr in sorted(ym["Year"].unique()):
+        yr_data = ym[ym["Year"] == yr].sort_values("Month_Num")
+        color = YEAR_COLORS.get(yr, "#333333")
+        fig.add_trace(go.Scatter(
+            x=yr_data["Month_Name"], y=yr_data["Sum"],
+            name=yr, mode="lines+markers",
+            line=dict(color=color, width=2.5),
+            marker=dict(size=8, color=color),
+            fill="tozeroy",
+            fillcolor=hex_to_rgba(color, 0.08),
+            hovertemplate=f"<b>{yr}</b> %{{x}}: %{{y:,.0f}}<extra></extra>",
+        ))
+    fig.update_layout(
+        height=380, margin=dict(l=0, r=0, t=10, b=0),
+        legend=dict(orientation="h", yanchor="bottom", y=1.01,
+                    xanchor="left", x=0, title_text="Рік:", font_size=12),
+        yaxis=dict(tickformat=",.0f", gridcolor="#eef2f7", title=""),
+        xaxis=dict(title="", gridcolor="#eef2f7"),
+        plot_bgcolor="white", paper_bgcolor="white", hovermode="x unified",
+    )
+    return fig
+
+
+def heatmap(heat_pivot: pd.DataFrame) -> go.Figure:
+    fig = px.imshow(
+        heat_pivot, color_continuous_scale="Blues",
+        aspect="auto", text_auto=",.0f",
+        labels=dict(x="Місяць", y="Рік", color="Витрати"),
+    )
+    fig.update_layout(
+        height=220, margin=dict(t=10, b=10, l=0, r=0),
+        xaxis_title="", yaxis_title="", coloraxis_showscale=False,
+    )
+    fig.update_traces(textfont_size=10)
+    return fig
+
+
+def top_bar(top_df: pd.DataFrame, top_n: int) -> go.Figure:
+    fig = go.Figure(go.Bar(
+        x=top_df["Sum"], y=top_df["Type_of_expense"],
+        orientation="h",
+        marker=dict(
+            color=top_df["Sum"],
+            colorscale=[[0, "#aac4de"], [1, "#c0392b"]],
+            showscale=False,
+        ),
+        text=[f"{v/1000:,.1f} тис." for v in top_df["Sum"]],
+        textposition="outside",
+        hovertemplate="<b>%{y}</b><br>%{x:,.0f}<extra></extra>",
+    ))
+    fig.update_layout(
+        height=max(400, top_n * 32 + 80),
+        margin=dict(l=0, r=80, t=10, b=10),
+        xaxis=dict(tickformat=",.0f", gridcolor="#eef2f7", title=""),
+        yaxis=dict(title=""),
+        plot_bgcolor="white", paper_bgcolor="white",
+    )
+    return fig
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""HTML-матриця «Категорія / Стаття» для вкладки «Витрати».
+
+Рядки будуються за один прохід по відсортованій таблиці статей і склеюються
+через join: без повторної фільтрації на кожну категорію та без iterrows().
+
+У режимі lazy=True в HTML потрапляють лише категорії та підсумок, а статті
+передаються компактним JSON і вставляються в таблицю при першому розгортанні групи.
+"""
+import json
+
+import pandas as pd
+
+TOTAL_COL = "Всього"
+
+MATRIX_TEMPLATE = """
+<style>
+* {{ box-sizing:border-box; }}
+body {{ margin:0; padding:0; font-family:'Segoe UI',sans-serif; font-size:13px;
+       background:transparent; }}
+.wrap {{ border-radius:10px; overflow:hidden; border:1px solid #dde6f0;
+         box-shadow:0 2px 10px rgba(10,35,70,0.08); }}
+table {{ width:100%; border-collapse:collapse; }}
+thead tr {{ background:linear-gradient(90deg,#0a2342,#1a5276); }}
+th {{ color:white; padding:10px 14px; text-align:left; font-weight:600;
+      font-size:12px; letter-spacing:0.3px; white-space:nowrap; }}
+th:not(:first-child) {{ text-align:right; }}
+td {{ padding:6px 14px; border-bottom:1px solid #eef2f7;
+      font-variant-numeric:tabular-nums; font-size:13px; }}
+td:not(:first-child) {{ text-align:right; }}
+tr.parent-row {{ background:#e8f0fb; font-weight:700; cursor:pointer;
+                 transition:background .15s; }}
+tr.parent-row:hover {{ background:#cfe0f5; }}
+tr.child-row  {{ background:#ffffff; color:#444; transition:background .15s; }}
+tr.child-row:hover {{ background:#f4f8fd; }}
+tr.total-row  {{ background:#1a5276; color:white; font-weight:700; font-size:13px; }}
+tr.total-row td {{ border-bottom:none; color:white; }}
+.toggle {{ display:inline-block; width:16px; font-weight:900; font-size:14px;
+           color:#1a5276; user-select:none; transition:transform .15s; }}
+.scroll-wrap {{ overflow-x:auto; }}
+@media (max-width: 768px) {{ .dist-col {{ display:none !important; }} }}
+</style>
+<div class="wrap"><div class="scroll-wrap">
+<table>
+  <thead><tr>
+    <th style="min-width:220px">Категорія / Стаття</th>
+    {extra_ths}
+    <th style="min-width:110px">Всього</th>
+  </tr></thead>
+  <tbody id="tbody">{rows_html}</tbody>
+</table>
+</div></div>
+<script>
+var CHILDREN = {children_json};
+var FMT = new Intl.NumberFormat('en-US', {{minimumFractionDigits: 2, maximumFractionDigits: 2}});
+function buildGroup(grpId) {{
+  var data = CHILDREN[grpId];
+  if (!data) return;
+  delete CHILDREN[grpId];
+  var anchor = document.getElementById('row_' + grpId);
+  var frag = document.createDocumentFragment();
+  data.forEach(function(c) {{
+    var tr = document.createElement('tr');
+    tr.className = 'child-row';
+    tr.setAttribute('data-group', grpId);
+    tr.style.display = 'none';
+    var name = document.createElement('td');
+    name.style.paddingLeft = '26px';
+    name.textContent = c[0];
+    tr.appendChild(name);
+    c[1].forEach(function(v) {{
+      var td = document.createElement('td');
+      td.className = 'dist-col';
+      if (v !== 0) {{ td.textContent = FMT.format(v); }}
+      else {{ td.style.color = '#ccc'; td.textContent = '—'; }}
+      tr.appendChild(td);
+    }});
+    var total = document.createElement('td');
+    total.textContent = FMT.format(c[2]);
+    tr.appendChild(total);
+    frag.appendChild(tr);
+  }});
+  anchor.parentNode.insertBefore(frag, anchor.nextSibling);
+}}
+function toggleGroup(grpId) {{
+  buildGroup(grpId);
+  var rows = document.querySelectorAll('[data-group="' + grpId + '"]');
+  var btn  = document.getElementById('btn_' + grpId);
+  var anyVisible = Array.from(rows).some(function(r) {{
+    return r.style.display !== 'none';
+  }});
+  rows.forEach(function(r) {{
+    r.style.display = anyVisible ? 'none' : 'table-row';
+  }});
+  if (btn) btn.innerHTML = anyVisible ? '&#8853;' : '&#8854;';
+  resize();
+}}
+function resize() {{
+  var h = document.body.scrollHeight;
+  if (window.frameElement) window.frameElement.style.height = h + 'px';
+}}
+document.addEventListener('DOMContentLoaded', resize);
+</script>
+"""
+
+
+def _money(values) -> list:
+    return [f"{v:,.2f}" for v in values]
+
+
+def build_matrix(matrix_df: pd.DataFrame):
+    """Готує дані матриці з агрегату Parent_Description × Type_of_expense [× DistributionBase].
+
+    Повертає (parent_grp, pivot_child, dist_types): суми категорій за спаданням і
+    статті з колонкою на кожну базу розподілу та підсумком TOTAL_COL.
+    """
+    dist_types = []
+    if "DistributionBase" in matrix_df.columns:
+        dist_types = sorted(matrix_df["DistributionBase"].dropna().unique().tolist())
+
+    parent_grp = (
+        matrix_df.groupby("Parent_Description", observed=True)["Sum"]
+        .sum().sort_values(ascending=False).reset_index()
+    )
+
+    if dist_types:
+        pivot_child = (
+            matrix_df
+            .pivot_table(
+                index=["Parent_Description", "Type_of_expense"],
+                columns="DistributionBase", values="Sum",
+                aggfunc="sum", fill_value=0, observed=True,
+            ).reset_index()
+        )
+        pivot_child.columns.name = None
+        for dt in dist_types:
+            if dt not in pivot_child.columns:
+                pivot_child[dt] = 0
+        pivot_child[TOTAL_COL] = pivot_child[dist_types].sum(axis=1)
+    else:
+        pivot_child = (
+            matrix_df.groupby(["Parent_Description", "Type_of_expense"], observed=True)["Sum"]
+            .sum().reset_index()
+        )
+        pivot_child[TOTAL_COL] = pivot_child["Sum"]
+    return parent_grp, pivot_child, dist_types
+
+
+def _child_rows_html(pivot_child: pd.DataFrame, dist_types: list) -> list:
+    """HTML-рядки статей (приховані) у порядку pivot_child."""
+    grp_ids = [f"grp{r + 1}" for r in pivot_child["_rank"]]
+    dist_cells = [
+        [f'<td class="dist-col">{s}</td>' if v != 0
+         else '<td class="dist-col" style="color:#ccc">—</td>'
+         for v, s in zip(pivot_child[dt], _money(pivot_child[dt]))]
+        for dt in dist_types
+    ]
+    dist_cells = ["".join(cells) for cells in zip(*dist_cells)] if dist_types else [""] * len(pivot_child)
+    return [
+        f'<tr class="child-row" data-group="{g}" style="display:none;">'
+        f'<td style="padding-left:26px;">{name}</td>{cells}<td>{total}</td></tr>'
+        for g, name, cells, total in zip(
+            grp_ids, pivot_child["Type_of_expense"], dist_cells, _money(pivot_child[TOTAL_COL]))
+    ]
+
+
+def _children_json(pivot_child: pd.DataFrame, dist_types: list, counts) -> str:
+    """{grpN: [[стаття, [суми по базах], всього], ...]} для lazy-режиму."""
+    names = pivot_child["Type_of_expense"].tolist()
+    dist_vals = pivot_child[dist_types].round(2).values.tolist() if dist_types else [[]] * len(names)
+    totals = pivot_child[TOTAL_COL].round(2).tolist()
+    records = [[n, d, t] for n, d, t in zip(names, dist_vals, totals)]
+    groups = {}
+    start = 0
+    for idx, n in enumerate(counts, start=1):
+        groups[f"grp{idx}"] = records[start:start + n]
+        start += n
+    # «</» екранується, щоб назва статті не могла закрити <script>.
+    return json.dumps(groups, ensure_ascii=False, separators=(",", ":")).replace("</", "<\\/")
+
+
+def render_matrix(matrix_df: pd.DataFrame, total_sum: float, lazy: bool = False):
+    """Повертає (html, кількість категорій) для components.html."""
+    parent_grp, pivot_child, dist_types = build_matrix(matrix_df)
+
+    # Статті впорядковуються за позицією категорії, а всередині — за спаданням суми,
+    # тож рядки кожної групи йдуть суцільним блоком.
+    rank = pd.Series(range(len(parent_grp)), index=parent_grp["Parent_Description"])
+    # reindex, а не map: для category map повернув би категоріальну колонку з порядком категорій.
+    pivot_child = pivot_child.assign(_rank=rank.reindex(pivot_child["Parent_Description"]).to_numpy())
+    pivot_child = pivot_child.sort_values(
+        ["_rank", TOTAL_COL], ascending=[True, False], kind="mergesort")
+
+    counts = pivot_child["_rank"].value_counts().reindex(range(len(parent_grp)), fill_value=0)
+    if lazy:
+        children_json = _children_json(pivot_child, dist_types, counts)
+        child_rows = []
+    else:
+        children_json = "{}"
+        child_rows = _child_rows_html(pivot_child, dist_types)
+
+    empty_tds = '<td class="dist-col"></td>' * len(dist_types)
+    parts = []
+    start = 0
+    for idx, (pname, psum, n) in enumerate(
+            zip(parent_grp["Parent_Description"], _money(parent_grp["Sum"]), counts), start=1):
+        grp_id = f"grp{idx}"
+        parts.append(
+            f'<tr class="parent-row" id="row_{grp_id}" onclick="toggleGroup(\'{grp_id}\')" style="cursor:pointer;">'
+            f'<td><span class="toggle" id="btn_{grp_id}">&#8853;</span> {pname}</td>'
+            f'{empty_tds}'
+            f'<td>{psum}</td></tr>'
+        )
+        parts.extend(child_rows[start:start + n])
+        start += n
+
+    if dist_types:
+        tot_by_dist = matrix_df.groupby("DistributionBase", observed=True)["Sum"].sum()
+        total_dist_tds = "".join(
+            f'<td class="dist-col">{tot_by_dist.get(dt, 0):,.2f}</td>' for dt in dist_types
+        )
+    else:
+        total_dist_tds = ""
+    parts.append(
+        f'<tr class="total-row"><td>Усього</td>'
+        f'{total_dist_tds}'
+        f'<td>{total_sum:,.2f}</td></tr>'
+    )
+
+    extra_ths = "".join(
+        f'<th class="dist-col" style="text-align:right;min-width:110px;white-space:nowrap">{dt}</th>'
+        for dt in dist_types
+    )
+    html = MATRIX_TEMPLATE.format(
+        extra_ths=extra_ths, rows_html="".join(parts), children_json=children_json)
+    return html, len(parent_grp)
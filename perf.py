@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Легкі заміри часу й розмірів по етапах конвеєра дашборду.
+
+span() і timed() міряють тривалість етапу, record() пише довільне значення
+(наприклад, розмір відповіді в байтах), count() — лічильник подій. Останні
+SAMPLES значень на етап зберігаються в пам'яті процесу, з них рахуються
+перцентилі (summary) та JSON-експорт. Етапи, довші за PERF_SLOW_MS, пишуться в
+лог разом із тегами сесії, тож повільну сесію можна зв'язати з етапом.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLES = 1000
+RECENT = 200
+
+_lock = threading.Lock()
+_samples = defaultdict(lambda: deque(maxlen=SAMPLES))
+_units = {}
+_counters = defaultdict(int)
+_recent = deque(maxlen=RECENT)
+_context = threading.local()
+
+
+def _slow_ms() -> float:
+    try:
+        return float(os.environ.get("PERF_SLOW_MS", 1000))
+    except ValueError:
+        return 1000.0
+
+
+def set_context(**tags) -> None:
+    """Теги поточного потоку (наприклад, session), що додаються до подій."""
+    _context.tags = tags
+
+
+def record(name: str, value: float, unit: str = "ms", **tags) -> None:
+    """Записує значення етапу name."""
+    tags = {**getattr(_context, "tags", {}), **tags}
+    with _lock:
+        _samples[name].append(value)
+        _units[name] = unit
+        _recent.append({"ts": time.time(), "name": name, "value": value, "unit": unit, **tags})
+    if unit == "ms" and value >= _slow_ms():
+        logger.info("Повільний етап %s: %.0f мс %s", name, value, tags)
+
+
+def count(name: str) -> None:
+    with _lock:
+        _counters[name] += 1
+
+
+@contextmanager
+def span(name: str, **tags):
+    """Міряє тривалість блоку в мілісекундах."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - started) * 1000, **tags)
+
+
+def timed(name: str):
+    """Декоратор: span навколо кожного виклику функції."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def summary() -> dict:
+    """{етап: count, unit, p50, p90, p99, max, mean} по збережених значеннях."""
+    with _lock:
+        snapshot = {name: (np.fromiter(values, float), _units[name])
+                    for name, values in _samples.items() if values}
+    out = {}
+    for name, (values, unit) in sorted(snapshot.items()):
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        out[name] = {
+            "count": len(values), "unit": unit,
+            "p50": float(p50), "p90": float(p90), "p99": float(p99),
+            "max": float(values.max()), "mean": float(values.mean()),
+        }
+    return out
+
+
+def counters() -> dict:
+    with _lock:
+        return dict(_counters)
+
+
+def export_json() -> str:
+    """Перцентилі, лічильники та останні події одним JSON-документом."""
+    with _lock:
+        recent = list(_recent)
+    return json.dumps(
+        {"generated_at": time.time(), "summary": summary(), "counters": counters(), "recent": recent},
+        ensure_ascii=False, indent=2, default=str,
+    )
+
+
+def reset() -> None:
+    with _lock:
+        _samples.clear()
+        _units.clear()
+        _counters.clear()
+        _recent.clear()
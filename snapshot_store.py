@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Файловий знімок таблиці витрат у колонковому форматі Arrow IPC.
+
+Файл пишеться без стиснення, тож при старті процесу його можна відкрити через
+memory map і не чекати на токен та DAX-запит до Power BI.
+"""
+import hashlib
+import json
+import os
+import time
+from typing import Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+
+META_KEY = b"pbi_snapshot"
+
+
+def schema_hash(schema: pa.Schema) -> str:
+    """Короткий хеш назв і типів колонок Arrow-схеми.
+
+    Хешується саме Arrow-схема, а не типи pandas: після to_pandas() колонки object
+    повертаються як str, і хеш за типами pandas ніколи б не збігся.
+    """
+    sig = ";".join(f"{f.name}:{f.type}" for f in schema)
+    return hashlib.sha1(sig.encode("utf-8")).hexdigest()[:16]
+
+
+def save_snapshot(path: str, df: pd.DataFrame, dataset_id: str, **extra) -> None:
+    """Атомарно записує DataFrame разом із метаданими (час, датасет, хеш схеми)."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    meta = {
+        "fetched_at": time.time(),
+        "dataset_id": dataset_id,
+        "schema_hash": schema_hash(table.schema),
+        **extra,
+    }
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        META_KEY: json.dumps(meta).encode("utf-8"),
+    })
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def load_snapshot(path: str, dataset_id: str) -> Optional[Tuple[pd.DataFrame, dict]]:
+    """Читає знімок через memory map; None, якщо файлу немає або він не підходить."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        meta = json.loads((table.schema.metadata or {}).get(META_KEY, b"{}"))
+        if meta.get("dataset_id") != dataset_id or meta.get("schema_hash") != schema_hash(table.schema):
+            return None
+        df = table.to_pandas()
+    except (pa.ArrowInvalid, OSError, ValueError):
+        return None
+    return df, meta
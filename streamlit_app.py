@@ -1,11 +1,19 @@
 ﻿# -*- coding: utf-8 -*-
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from db_connection import get_expenses_data
+from db_connection import (get_expenses_data, get_expenses_aggregate, get_flag, get_int_secret,
+                           peek_expenses_data)
+from matrix_renderer import render_matrix
+from aggregates import (UA_MONTHS, DimensionIndex, FilterCache, build_cube, filter_key, filter_rows,
+                        prepare_expenses, rollup)
+from checklist import checklist
+from data_store import DataStore, Loaded
+from figures import FigureCache, dept_bar, dept_pie, heatmap, top_bar, trend_line
 from datetime import datetime
+import time
+import perf
 import streamlit.components.v1 as components
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 # ============================================================
 # КОНФІГУРАЦІЯ
@@ -17,12 +25,6 @@ st.set_page_config(
     initial_sidebar_state="collapsed",
 )
 
-UA_MONTHS = {
-    1: "Січень", 2: "Лютий", 3: "Березень", 4: "Квітень",
-    5: "Травень", 6: "Червень", 7: "Липень", 8: "Серпень",
-    9: "Вересень", 10: "Жовтень", 11: "Листопад", 12: "Грудень",
-}
-
 # ── Custom CSS ──────────────────────────────────────────────
 st.markdown("""
 <style>
@@ -175,8 +177,11 @@ def check_password() -> bool:
             submitted = st.form_submit_button("🔓 Увійти", use_container_width=True)
         if submitted:
             stored = str(st.secrets.get("password", "2101")).strip()
-            if pwd.strip() and pwd.strip() == stored:
+            admin = str(st.secrets.get("admin_password", "")).strip()
+            if pwd.strip() and pwd.strip() in (stored, admin):
                 st.session_state.password_correct = True
+                # Пароль адміністратора додатково відкриває панель продуктивності.
+                st.session_state.is_admin = bool(admin) and pwd.strip() == admin
                 st.rerun()
             else:
                 st.error("❌ Неправильний пароль!")
@@ -185,35 +190,95 @@ def check_password() -> bool:
 if not check_password():
     st.stop()
 
+run_started = time.perf_counter()
+_ctx = get_script_run_ctx()
+perf.set_context(session=_ctx.session_id[:8] if _ctx else "")
+
 # ============================================================
 # ЗАВАНТАЖЕННЯ ДАНИХ
 # ============================================================
-@st.cache_data(ttl=1800, show_spinner="⏳ Завантаження даних...")
-def load_data() -> pd.DataFrame:
-    df = get_expenses_data()
-    if df.empty:
-        return df
-    df["Period"] = pd.to_datetime(df["Period"], errors="coerce")
-    df["Year"] = df["Period"].dt.year
-    df["Month_Num"] = df["Period"].dt.month
-    df["Month_Name"] = df["Month_Num"].map(UA_MONTHS)
-    df["Sum"] = pd.to_numeric(df["Sum"], errors="coerce").fillna(0)
-    return df
-
-try:
-    df_raw = load_data()
-except Exception as e:
-    st.error("Помилка при отриманні даних:")
-    st.exception(e)
-    st.stop()
+# У режимі PBI_AGGREGATE_PUSHDOWN сирі рядки не завантажуються: load_data бере
+# лише суми у розрізі Period × Відділ × Стаття (для сайдбару), а кожна вкладка
+# запитує в Power BI вже агрегований результат під поточні фільтри.
+PUSHDOWN = get_flag("PBI_AGGREGATE_PUSHDOWN")
+
+def prepare_data(df: pd.DataFrame) -> pd.DataFrame:
+    return prepare_expenses(df, float32=get_flag("PBI_FLOAT32_SUM"))
+
+def make_cube(df: pd.DataFrame) -> pd.DataFrame:
+    """Куб сум (Рік × Місяць × Відділ × Стаття × Категорія × База) з рядків завантаження."""
+    freshness = {k: df.attrs[k] for k in ("refreshed_at", "stale") if k in df.attrs}
+    cube = build_cube(prepare_data(df))
+    # Версія завантаження входить у ключі FilterCache, щоб після оновлення не брати старі зрізи.
+    cube.attrs.update(freshness, version=time.time_ns())
+    return cube
+
+def load_cube(full_reload: bool = False) -> pd.DataFrame:
+    """full_reload=True перечитує всю таблицю, а не лише останні періоди (кнопка «Оновити дані»).
+
+    Помилка Power BI доходить до DataStore: він лишає попередню версію і показує помилку.
+    """
+    if PUSHDOWN:
+        return make_cube(get_expenses_aggregate(["Period", "Department", "Type_of_expense"]))
+    return make_cube(get_expenses_data(full_reload=full_reload, fallback=False))
+
+def load_stale_cube() -> Loaded | None:
+    """Куб з останнього збереженого знімка — показується, поки вантажаться свіжі дані."""
+    if PUSHDOWN:
+        return None
+    peeked = peek_expenses_data()
+    if peeked is None:
+        return None
+    df, refreshed_at = peeked
+    return Loaded(make_cube(df), refreshed_at, 0.0, stale=True)
+
+@st.cache_resource
+def data_store() -> DataStore:
+    """Куб, спільний для всіх сесій; фоновий потік перебудовує його кожні PBI_REFRESH_SECONDS.
+
+    Куб лише читається: фільтри дають позиції рядків (filter_rows), а не копії.
+    """
+    return DataStore(load_cube, interval=get_int_secret("PBI_REFRESH_SECONDS", 1800),
+                     stale=load_stale_cube)
+
+@st.cache_resource(max_entries=2)
+def cube_index(version: int, _cube: pd.DataFrame) -> DimensionIndex:
+    """Індекс вимірів куба; один на версію завантаження, спільний для сесій."""
+    return DimensionIndex(_cube)
+
+@st.cache_resource
+def filter_cache() -> FilterCache:
+    return FilterCache(max_bytes=64 * 2**20, name="filter_cache")
+
+@st.cache_resource
+def figure_cache() -> FigureCache:
+    return FigureCache(max_bytes=16 * 2**20, name="figure_cache")
+
+def render_header(date_html: str, badge_html: str = "") -> None:
+    st.markdown(f"""
+<div class="header-banner">
+  <div class="header-left">
+    <div class="header-logo-circle">FTP</div>
+    <div>
+      <div class="header-title">Операційні витрати</div>
+      <div class="header-subtitle">Freight Transport Partner &nbsp;•&nbsp; Бюджетна аналітика</div>
+    </div>
+  </div>
+  <div class="header-right">
+    <div class="header-date">{date_html}</div>
+    {badge_html}
+  </div>
+</div>
+""", unsafe_allow_html=True)
 
-if df_raw.empty:
-    st.warning("Дані не знайдено або таблиця порожня.")
-    st.stop()
+@st.fragment(run_every=2)
+def await_data(shown_version) -> None:
+    """Поки сховище вантажить дані, раз на 2 с перевіряє, чи з'явилась нова версія, і перезапускає сторінку."""
+    latest = store.current(wait=False)
+    version = latest.data.attrs.get("version") if latest is not None else None
+    if version != shown_version or not store.refreshing:
+        st.rerun()
 
-# ============================================================
-# SIDEBAR
-# ============================================================
 with st.sidebar:
     # ── FTP Logo ─────────────────────────────────────────────
     st.markdown("""
@@ -226,25 +291,51 @@ with st.sidebar:
     </div>
     """, unsafe_allow_html=True)
 
+# Сторінка не чекає на Power BI: поки немає жодних даних, показується каркас,
+# а після завантаження await_data перезапускає її вже з даними.
+store = data_store()
+loaded = store.current(wait=False)
+# Рахується лише основний запит сторінки, а не опитування з await_data.
+perf.count("data.hit" if loaded is not None else "data.miss")
+if loaded is None:
+    if store.last_error is not None and not store.refreshing:
+        render_header("Дані недоступні")
+        st.error("Помилка при отриманні даних:")
+        st.exception(store.last_error)
+        if st.button("🔄 Спробувати ще", key="retry_load"):
+            store.refresh(wait=False)
+            st.rerun()
+    else:
+        render_header("⏳ Завантаження даних…")
+        st.info("⏳ Завантажуємо дані з Power BI — звіт з'явиться автоматично.")
+        await_data(None)
+    st.stop()
+cube = loaded.data
+
+if cube.empty:
+    st.warning("Дані не знайдено або таблиця порожня.")
+    st.stop()
+
+# ============================================================
+# SIDEBAR
+# ============================================================
+with st.sidebar:
     # ── Скидання (до рендеру будь-яких віджетів) ────────────
+    # Списки відділів і статей тримають вибір у власному стані, тож скидання
+    # монтує їх під новим ключем.
     if st.session_state.pop("_do_reset", False):
-        for d in st.session_state.get("dept_states", {}):
-            st.session_state["dept_states"][d] = False
-            st.session_state[f"dept_cb_{d}"] = False
-        for e in st.session_state.get("expense_states", {}):
-            st.session_state["expense_states"][e] = False
-            st.session_state[f"exp_cb_{e}"] = False
+        st.session_state["filters_nonce"] = st.session_state.get("filters_nonce", 0) + 1
         st.session_state["months_multiselect"] = []
-        st.session_state["expense_search"] = ""
+    nonce = st.session_state.get("filters_nonce", 0)
 
     # ── Рік і Місяці ─────────────────────────────────────────
     st.markdown('<div class="sidebar-section-label">📅 Період звіту</div>', unsafe_allow_html=True)
-    all_years_sb = sorted(df_raw["Year"].dropna().unique().astype(int), reverse=True)
+    all_years_sb = sorted(cube["Year"].dropna().unique().astype(int), reverse=True)
     sel_year = st.selectbox("Рік", options=all_years_sb, index=0,
                             key="year_select", label_visibility="collapsed",
                             format_func=lambda y: f"{y}")
     months_avail_sb = sorted(
-        df_raw[df_raw["Year"] == sel_year]["Month_Num"].dropna().unique().astype(int))
+        cube[cube["Year"] == sel_year]["Month_Num"].dropna().unique().astype(int))
     sel_months = st.multiselect(
         "Місяці", options=months_avail_sb,
         key="months_multiselect", label_visibility="collapsed",
@@ -255,74 +346,99 @@ with st.sidebar:
 
     # ── Відділ (Department) ───────────────────────────────────
     st.markdown('<div class="sidebar-section-label">🏢 Відділ</div>', unsafe_allow_html=True)
-    all_depts = sorted(df_raw["Department"].dropna().unique().tolist())
-    if "dept_states" not in st.session_state:
-        st.session_state["dept_states"] = {d: False for d in all_depts}
-    for d in all_depts:
-        if d not in st.session_state["dept_states"]:
-            st.session_state["dept_states"][d] = False
-    dept_container = st.container(height=165)
-    with dept_container:
-        for dept in all_depts:
-            st.session_state["dept_states"][dept] = st.checkbox(
-                dept, value=st.session_state["dept_states"].get(dept, False),
-                key=f"dept_cb_{dept}")
-    selected_depts = [d for d in all_depts if st.session_state["dept_states"].get(d, False)]
-    if not selected_depts:
-        selected_depts = all_depts
+    all_depts = sorted(cube["Department"].dropna().unique().tolist())
+    selected_depts = checklist(all_depts, key=f"dept_list_{nonce}")
+    selected_depts = sorted(selected_depts) if selected_depts else all_depts
 
     # ── Стаття витрат (Type_of_expense) ──────────────────────
     st.markdown('<div class="sidebar-section-label">📌 Стаття витрат</div>', unsafe_allow_html=True)
-    search_expense = st.text_input("Пошук статті витрат", placeholder="🔍 Пошук", key="expense_search",
-                                   label_visibility="collapsed")
-    all_expenses = sorted(df_raw["Type_of_expense"].dropna().unique().tolist())
-    filtered_expenses_list = (
-        [e for e in all_expenses if search_expense.lower() in e.lower()]
-        if search_expense else all_expenses
-    )
-    if "expense_states" not in st.session_state:
-        st.session_state["expense_states"] = {e: False for e in all_expenses}
-    for e in all_expenses:
-        if e not in st.session_state["expense_states"]:
-            st.session_state["expense_states"][e] = False
-    exp_container = st.container(height=165)
-    with exp_container:
-        for exp in filtered_expenses_list:
-            st.session_state["expense_states"][exp] = st.checkbox(
-                exp, value=st.session_state["expense_states"].get(exp, False),
-                key=f"exp_cb_{exp}")
-    selected_expenses = [e for e in all_expenses if st.session_state["expense_states"].get(e, False)]
-    if not selected_expenses:
-        selected_expenses = all_expenses
+    all_expenses = sorted(cube["Type_of_expense"].dropna().unique().tolist())
+    selected_expenses = checklist(all_expenses, key=f"exp_list_{nonce}", search=True)
+    selected_expenses = sorted(selected_expenses) if selected_expenses else all_expenses
 
     # ── Дії ──────────────────────────────────────────────────
     st.markdown("<div style='height:6px'></div>", unsafe_allow_html=True)
     if st.button("🧹 Скинути фільтри", use_container_width=True, key="reset_filters"):
         st.session_state["_do_reset"] = True
         st.rerun()
-    if st.button("🔄 Оновити дані", use_container_width=True, key="refresh_btn"):
-        st.cache_data.clear()
+    if st.button("🔄 Оновити дані", use_container_width=True, key="refresh_btn",
+                 disabled=store.refreshing):
+        # Повне перечитування у фоні: підхоплює й виправлення старіші за PBI_INCREMENTAL_LOOKBACK_MONTHS.
+        # Сторінка й інші сесії працюють зі старою версією, доки нова не буде готова.
+        store.refresh(wait=False, full=True)
         st.rerun()
+    if store.last_error is not None and not store.refreshing:
+        st.error("Не вдалося оновити дані, показано попередню версію.")
 
 # ============================================================
 # ФІЛЬТРАЦІЯ
 # ============================================================
-filtered_df = df_raw[
-    (df_raw["Year"] == sel_year) &
-    (df_raw["Month_Num"].isin(sel_months)) &
-    (df_raw["Department"].isin(selected_depts)) &
-    (df_raw["Type_of_expense"].isin(selected_expenses))
-].copy()
-
-if filtered_df.empty:
+# Вибір «усі значення» нормалізується в None, тож ключ не залежить від довжини списків.
+f_depts = selected_depts if len(selected_depts) < len(all_depts) else None
+f_expenses = selected_expenses if len(selected_expenses) < len(all_expenses) else None
+f_months = sel_months if len(sel_months) < len(months_avail_sb) else None
+data_version = cube.attrs.get("version")
+fcache = filter_cache()
+figs = figure_cache()
+period_key = filter_key(data_version, sel_year, f_months, f_depts, f_expenses)
+trend_key = filter_key(data_version, None, None, f_depts, f_expenses)
+
+dim_index = cube_index(data_version, cube)
+
+timed_filter_rows = perf.timed("filter.rows")(filter_rows)
+
+# У кеші лежать лише позиції рядків; сам куб один на всі сесії і не копіюється.
+filtered_rows = fcache.get_or_compute(
+    (period_key, "rows"),
+    lambda: timed_filter_rows(cube, sel_year, f_months, f_depts, f_expenses, index=dim_index))
+
+if not len(filtered_rows):
     st.info("Немає даних за обраними фільтрами.")
     st.stop()
 
+@st.cache_data(ttl=1800, show_spinner=False)
+def load_aggregate(by: tuple, year, months: tuple, depts: tuple, expenses: tuple,
+                   version: int) -> pd.DataFrame:
+    """Агрегат із Power BI; version прив'язує кеш до версії даних у сховищі."""
+    return get_expenses_aggregate(
+        list(by), year=year, months=list(months),
+        departments=list(depts), expense_types=list(expenses))
+
+def aggregate(by: list, period: bool = True, dropna: bool = True) -> pd.DataFrame:
+    """Сума Sum у розрізі by за поточними фільтрами.
+
+    period=False ігнорує фільтр року й місяців (для динаміки за всі роки).
+    dropna=False зберігає групи з порожніми значеннями by (див. rollup).
+    Вибір «усі значення» передається порожнім фільтром, щоб не роздувати DAX.
+    """
+    def compute() -> pd.DataFrame:
+        with perf.span(f"aggregate.{'+'.join(by)}"):
+            return compute_aggregate()
+
+    def compute_aggregate() -> pd.DataFrame:
+        if PUSHDOWN:
+            return load_aggregate(
+                tuple(by),
+                sel_year if period else None,
+                tuple(sorted(sel_months)) if period else (),
+                tuple(f_depts or ()),
+                tuple(f_expenses or ()),
+                data_version,
+            )
+        if period:
+            return rollup(cube, by, rows=filtered_rows, dropna=dropna)
+        return rollup(cube, by, rows=filter_rows(cube, departments=f_depts, expense_types=f_expenses,
+                                                 index=dim_index), dropna=dropna)
+
+    # Результат спільний для всіх сесій — далі його лише читаємо.
+    return fcache.get_or_compute((period_key if period else trend_key, tuple(by), dropna), compute)
+
 # ── KPI-розрахунки ────────────────────────────────────────
-unplanned_mask = filtered_df["Type_of_expense"].str.contains(
+by_expense = aggregate(["Type_of_expense"])
+unplanned_mask = by_expense["Type_of_expense"].str.contains(
     "поза план|позаплан", case=False, na=False)
-unplanned_sum = filtered_df.loc[unplanned_mask, "Sum"].sum()
-total_sum     = filtered_df["Sum"].sum()
+unplanned_sum = by_expense.loc[unplanned_mask, "Sum"].sum()
+total_sum     = by_expense["Sum"].sum()
 planned_diff  = total_sum - unplanned_sum
 
 def fmt_tis(v: float) -> str:
@@ -330,11 +446,10 @@ def fmt_tis(v: float) -> str:
         return f"{v/1000:,.2f} ТИС."
     return f"{v:,.2f}"
 
-def hex_to_rgba(hex_color: str, alpha: float = 0.10) -> str:
-    """Convert '#rrggbb' to 'rgba(r,g,b,alpha)'."""
-    h = hex_color.lstrip('#')
-    r, g, b = int(h[0:2], 16), int(h[2:4], 16), int(h[4:6], 16)
-    return f"rgba({r},{g},{b},{alpha})"
+def show_chart(fig, name: str) -> None:
+    """st.plotly_chart із заміром серіалізації та відправки фігури."""
+    with perf.span(f"figure.render.{name}"):
+        st.plotly_chart(fig, width='stretch')
 
 # ── Рядок для позначення обраного періоду ─────────────────
 if len(sel_months) == len(months_avail_sb):
@@ -345,394 +460,195 @@ else:
     period_str = ", ".join(UA_MONTHS[m] for m in sorted(sel_months)) + f" {sel_year}"
 
 # ── Гарний заголовок ───────────────────────────────────────
-st.markdown(f"""
-<div class="header-banner">
-  <div class="header-left">
-    <div class="header-logo-circle">FTP</div>
-    <div>
-      <div class="header-title">Операційні витрати</div>
-      <div class="header-subtitle">Freight Transport Partner &nbsp;•&nbsp; Бюджетна аналітика</div>
-    </div>
-  </div>
-  <div class="header-right">
-    <div class="header-date">Станом на: {datetime.now().strftime('%d.%m.%Y %H:%M')}</div>
-    <div class="header-badge">📅 {period_str}</div>
-  </div>
-</div>
-""", unsafe_allow_html=True)
+date_html = f"Станом на: {datetime.fromtimestamp(loaded.refreshed_at).strftime('%d.%m.%Y %H:%M')}"
+if store.refreshing:
+    date_html += " · ⏳ оновлюється…"
+elif loaded.stale:
+    date_html += " · збережені дані"
+else:
+    date_html += f" · оновлено за {loaded.duration:.1f} с"
+render_header(date_html, f'<div class="header-badge">📅 {period_str}</div>')
+if store.refreshing:
+    # Поки йде оновлення, сторінка показує наявну версію і сама підхопить нову.
+    await_data(data_version)
 
 # ============================================================
 # ВКЛАДКИ
 # ============================================================
 st.markdown("<div style='height:12px'></div>", unsafe_allow_html=True)
+# on_change="rerun" вмикає ліниве виконання: код і графіки рахуються лише для
+# відкритої вкладки (tab.open), а інші будуються, коли на них перейдуть.
 tab_expenses, tab_dept, tab_trends, tab_top = st.tabs([
     "📊  Витрати",
     "🏢  По відділах",
     "📈  Динаміка",
     "🔥  ТОП",
-])
+], key="active_tab", on_change="rerun")
 
 # ─────── TAB 0: АНАЛІЗ ВИТРАТ (KPI + матриця) ────────────
 with tab_expenses:
-    # ── KPI картки (responsive flex) ─────────────────────────
-    val_color3 = "#e63946" if planned_diff < 0 else "#111"
-    st.markdown(f"""
-    <style>
-    .kpi-row {{ display:flex; flex-wrap:wrap; gap:10px; margin-bottom:14px; }}
-    .kpi-card {{
-        flex:1 1 160px; background:#f8fafd; border:1px solid #dde6f0;
-        border-radius:10px; padding:14px 16px; text-align:center;
-        box-shadow:0 1px 4px rgba(10,35,70,0.06);
-    }}
-    .kpi-card .lbl {{ font-size:11px; color:#888; line-height:1.4; margin-bottom:6px; }}
-    .kpi-card .val {{ font-size:22px; font-weight:900; line-height:1.2; }}
-    @media(max-width:480px) {{
-        .kpi-card {{ flex:1 1 100%; }}
-        .kpi-card .val {{ font-size:20px; }}
-    }}
-    </style>
-    <div class="kpi-row">
-      <div class="kpi-card">
-        <div class="lbl">Операційних витрат усього $</div>
-        <div class="val" style="color:#111">{fmt_tis(total_sum)}</div>
-      </div>
-      <div class="kpi-card">
-        <div class="lbl">Непланові витрати $</div>
-        <div class="val" style="color:#111">{fmt_tis(unplanned_sum)}</div>
-      </div>
-      <div class="kpi-card">
-        <div class="lbl">Операційні витрати $</div>
-        <div class="val" style="color:{val_color3}">{planned_diff:,.2f}</div>
-      </div>
-    </div>
-    """, unsafe_allow_html=True)
-
-    # ── Матриця витрат на повну ширину ────────────────────────
-    if "Parent_Description" not in filtered_df.columns:
-        st.warning("Відсутня колонка 'Parent_Description'.")
-    else:
-        dist_types = []
-        if "DistributionBase" in filtered_df.columns:
-            dist_types = sorted(
-                filtered_df["DistributionBase"].dropna().unique().tolist()
-            )
-
-        parent_grp = (
-            filtered_df.groupby("Parent_Description")["Sum"]
-            .sum().sort_values(ascending=False).reset_index()
-        )
-
-        if dist_types:
-            pivot_child = (
-                filtered_df
-                .groupby(["Parent_Description", "Type_of_expense", "DistributionBase"])["Sum"]
-                .sum().reset_index()
-                .pivot_table(
-                    index=["Parent_Description", "Type_of_expense"],
-                    columns="DistributionBase", values="Sum",
-                    aggfunc="sum", fill_value=0,
-                ).reset_index()
-            )
-            pivot_child.columns.name = None
-            for dt in dist_types:
-                if dt not in pivot_child.columns:
-                    pivot_child[dt] = 0
-            pivot_child["Всього"] = pivot_child[dist_types].sum(axis=1)
-        else:
-            pivot_child = (
-                filtered_df.groupby(["Parent_Description", "Type_of_expense"])["Sum"]
-                .sum().reset_index()
-            )
-            pivot_child["Всього"] = pivot_child["Sum"]
-
-        extra_ths = "".join(
-            f'<th class="dist-col" style="text-align:right;min-width:110px;white-space:nowrap">{dt}</th>'
-            for dt in dist_types
-        )
-
-        rows_html = ""
-        for idx, p_row in enumerate(parent_grp.itertuples(), start=1):
-            pname  = p_row.Parent_Description
-            psum   = p_row.Sum
-            grp_id = f"grp{idx}"
-            empty_tds = "".join('<td class="dist-col"></td>' for _ in dist_types)
-            rows_html += (
-                f'<tr class="parent-row" onclick="toggleGroup(\'{grp_id}\')" style="cursor:pointer;">'
-                f'<td><span class="toggle" id="btn_{grp_id}">&#8853;</span> {pname}</td>'
-                f'{empty_tds}'
-                f'<td>{psum:,.2f}</td></tr>'
-            )
-            children = pivot_child[pivot_child["Parent_Description"] == pname]
-            for _, c_row in children.sort_values("Всього", ascending=False).iterrows():
-                child_dist_tds = "".join(
-                    f'<td class="dist-col">{c_row[dt]:,.2f}</td>' if c_row[dt] != 0
-                    else '<td class="dist-col" style="color:#ccc">—</td>'
-                    for dt in dist_types
-                )
-                rows_html += (
-                    f'<tr class="child-row" data-group="{grp_id}" style="display:none;">'
-                    f'<td style="padding-left:26px;">{c_row["Type_of_expense"]}</td>'
-                    f'{child_dist_tds}'
-                    f'<td>{c_row["Всього"]:,.2f}</td></tr>'
-                )
-
-        if dist_types:
-            tot_by_dist = filtered_df.groupby("DistributionBase")["Sum"].sum()
-            total_dist_tds = "".join(
-                f'<td class="dist-col">{tot_by_dist.get(dt, 0):,.2f}</td>' for dt in dist_types
-            )
-        else:
-            total_dist_tds = ""
-        rows_html += (
-            f'<tr class="total-row"><td>Усього</td>'
-            f'{total_dist_tds}'
-            f'<td>{total_sum:,.2f}</td></tr>'
-        )
-
-        table_html = f"""
+    if tab_expenses.open:
+        # ── KPI картки (responsive flex) ─────────────────────────
+        val_color3 = "#e63946" if planned_diff < 0 else "#111"
+        st.markdown(f"""
         <style>
-        * {{ box-sizing:border-box; }}
-        body {{ margin:0; padding:0; font-family:'Segoe UI',sans-serif; font-size:13px;
-               background:transparent; }}
-        .wrap {{ border-radius:10px; overflow:hidden; border:1px solid #dde6f0;
-                 box-shadow:0 2px 10px rgba(10,35,70,0.08); }}
-        table {{ width:100%; border-collapse:collapse; }}
-        thead tr {{ background:linear-gradient(90deg,#0a2342,#1a5276); }}
-        th {{ color:white; padding:10px 14px; text-align:left; font-weight:600;
-              font-size:12px; letter-spacing:0.3px; white-space:nowrap; }}
-        th:not(:first-child) {{ text-align:right; }}
-        td {{ padding:6px 14px; border-bottom:1px solid #eef2f7;
-              font-variant-numeric:tabular-nums; font-size:13px; }}
-        td:not(:first-child) {{ text-align:right; }}
-        tr.parent-row {{ background:#e8f0fb; font-weight:700; cursor:pointer;
-                         transition:background .15s; }}
-        tr.parent-row:hover {{ background:#cfe0f5; }}
-        tr.child-row  {{ background:#ffffff; color:#444; transition:background .15s; }}
-        tr.child-row:hover {{ background:#f4f8fd; }}
-        tr.total-row  {{ background:#1a5276; color:white; font-weight:700; font-size:13px; }}
-        tr.total-row td {{ border-bottom:none; color:white; }}
-        .toggle {{ display:inline-block; width:16px; font-weight:900; font-size:14px;
-                   color:#1a5276; user-select:none; transition:transform .15s; }}
-        .scroll-wrap {{ overflow-x:auto; }}
-        @media (max-width: 768px) {{ .dist-col {{ display:none !important; }} }}
-        </style>
-        <div class="wrap"><div class="scroll-wrap">
-        <table>
-          <thead><tr>
-            <th style="min-width:220px">Категорія / Стаття</th>
-            {extra_ths}
-            <th style="min-width:110px">Всього</th>
-          </tr></thead>
-          <tbody id="tbody">{rows_html}</tbody>
-        </table>
-        </div></div>
-        <script>
-        function toggleGroup(grpId) {{
-          var rows = document.querySelectorAll('[data-group="' + grpId + '"]');
-          var btn  = document.getElementById('btn_' + grpId);
-          var anyVisible = Array.from(rows).some(function(r) {{
-            return r.style.display !== 'none';
-          }});
-          rows.forEach(function(r) {{
-            r.style.display = anyVisible ? 'none' : 'table-row';
-          }});
-          if (btn) btn.innerHTML = anyVisible ? '&#8853;' : '&#8854;';
-          resize();
+        .kpi-row {{ display:flex; flex-wrap:wrap; gap:10px; margin-bottom:14px; }}
+        .kpi-card {{
+            flex:1 1 160px; background:#f8fafd; border:1px solid #dde6f0;
+            border-radius:10px; padding:14px 16px; text-align:center;
+            box-shadow:0 1px 4px rgba(10,35,70,0.06);
         }}
-        function resize() {{
-          var h = document.body.scrollHeight;
-          if (window.frameElement) window.frameElement.style.height = h + 'px';
+        .kpi-card .lbl {{ font-size:11px; color:#888; line-height:1.4; margin-bottom:6px; }}
+        .kpi-card .val {{ font-size:22px; font-weight:900; line-height:1.2; }}
+        @media(max-width:480px) {{
+            .kpi-card {{ flex:1 1 100%; }}
+            .kpi-card .val {{ font-size:20px; }}
         }}
-        document.addEventListener('DOMContentLoaded', resize);
-        </script>
-        """
-        # Only parent rows + total row are visible initially (children are collapsed)
-        visible_rows = len(parent_grp) + 2
-        tbl_height = visible_rows * 34 + 60
-        components.html(table_html, height=tbl_height, scrolling=False)
+        </style>
+        <div class="kpi-row">
+          <div class="kpi-card">
+            <div class="lbl">Операційних витрат усього $</div>
+            <div class="val" style="color:#111">{fmt_tis(total_sum)}</div>
+          </div>
+          <div class="kpi-card">
+            <div class="lbl">Непланові витрати $</div>
+            <div class="val" style="color:#111">{fmt_tis(unplanned_sum)}</div>
+          </div>
+          <div class="kpi-card">
+            <div class="lbl">Операційні витрати $</div>
+            <div class="val" style="color:{val_color3}">{planned_diff:,.2f}</div>
+          </div>
+        </div>
+        """, unsafe_allow_html=True)
+
+        # ── Матриця витрат на повну ширину ────────────────────────
+        if "Parent_Description" not in cube.columns and not PUSHDOWN:
+            st.warning("Відсутня колонка 'Parent_Description'.")
+        else:
+            has_dist = PUSHDOWN or "DistributionBase" in cube.columns
+            matrix_by = ["Parent_Description", "Type_of_expense"] + (["DistributionBase"] if has_dist else [])
+            def build_matrix_html():
+                # Рядки з порожньою базою розподілу входять у суми категорій, як і в «Усього».
+                matrix_df = aggregate(matrix_by, dropna=False)
+                with perf.span("matrix.render"):
+                    return render_matrix(matrix_df, total_sum, lazy=True)
+
+            table_html, n_parents = fcache.get_or_compute((period_key, "matrix_html"), build_matrix_html)
+            perf.record("matrix.html.bytes", len(table_html.encode("utf-8")), unit="B")
+            # Only parent rows + total row are visible initially (children are collapsed)
+            visible_rows = n_parents + 2
+            tbl_height = visible_rows * 34 + 60
+            components.html(table_html, height=tbl_height, scrolling=False)
 
 # ─────── TAB 1: ПО ВІДДІЛАХ ──────────────────────────────
 with tab_dept:
-    dept_sum = (
-        filtered_df.groupby("Department")["Sum"]
-        .sum().sort_values(ascending=False).reset_index()
-    )
-    dept_total = dept_sum["Sum"].sum()
-    dept_sum["Pct"] = dept_sum["Sum"] / dept_total * 100
-    dept_sum["Rank"] = range(1, len(dept_sum) + 1)
-
-    # Топ-3 картки
-    top3 = dept_sum.head(3)
-    bg_colors = ["#0a2342", "#1a5276", "#5d8aa8"]
-    d_cols = st.columns(len(top3))
-    for i, (col, row) in enumerate(zip(d_cols, top3.itertuples())):
-        col.markdown(f"""
-        <div style="background:{bg_colors[i]};border-radius:10px;padding:14px 16px;
-             color:white;text-align:center;margin-bottom:8px;">
-          <div style="font-size:11px;opacity:.75;margin-bottom:4px;">🏆 Місце #{row.Rank}</div>
-          <div style="font-size:13px;font-weight:700;margin-bottom:6px;">{row.Department}</div>
-          <div style="font-size:22px;font-weight:900;">{row.Sum/1000:,.1f} тис.</div>
-          <div style="font-size:12px;opacity:.7;margin-top:4px;">{row.Pct:.1f}% від загального</div>
-        </div>""", unsafe_allow_html=True)
-
-    st.markdown("<br>", unsafe_allow_html=True)
-    col_bar, col_pie2 = st.columns([1.4, 1])
-    with col_bar:
-        fig_dbar = go.Figure(go.Bar(
-            x=dept_sum["Sum"], y=dept_sum["Department"],
-            orientation="h",
-            marker=dict(
-                color=dept_sum["Sum"],
-                colorscale=[[0, "#aac4de"], [0.5, "#2471a3"], [1, "#0a2342"]],
-                showscale=False,
-            ),
-            text=[f"{v/1000:,.1f} тис. ({p:.1f}%)"
-                  for v, p in zip(dept_sum["Sum"], dept_sum["Pct"])],
-            textposition="outside",
-            hovertemplate="<b>%{y}</b><br>%{x:,.0f}<extra></extra>",
-        ))
-        fig_dbar.update_layout(
-            height=max(280, len(dept_sum) * 42 + 60),
-            margin=dict(l=0, r=120, t=10, b=10),
-            xaxis=dict(tickformat=",.0f", gridcolor="#eef2f7", title=""),
-            yaxis=dict(autorange="reversed", title=""),
-            plot_bgcolor="white", paper_bgcolor="white",
+    if tab_dept.open:
+        dept_sum = (
+            aggregate(["Department"])
+            .sort_values("Sum", ascending=False).reset_index(drop=True)
         )
-        st.plotly_chart(fig_dbar, width='stretch')
-
-    with col_pie2:
-        fig_dp = px.pie(
-            dept_sum, names="Department", values="Sum", hole=0.5,
-            color_discrete_sequence=px.colors.sequential.Blues_r,
+        dept_total = dept_sum["Sum"].sum()
+        dept_sum["Pct"] = dept_sum["Sum"] / dept_total * 100
+        dept_sum["Rank"] = range(1, len(dept_sum) + 1)
+
+        # Топ-3 картки
+        top3 = dept_sum.head(3)
+        bg_colors = ["#0a2342", "#1a5276", "#5d8aa8"]
+        d_cols = st.columns(len(top3))
+        for i, (col, row) in enumerate(zip(d_cols, top3.itertuples())):
+            col.markdown(f"""
+            <div style="background:{bg_colors[i]};border-radius:10px;padding:14px 16px;
+                 color:white;text-align:center;margin-bottom:8px;">
+              <div style="font-size:11px;opacity:.75;margin-bottom:4px;">🏆 Місце #{row.Rank}</div>
+              <div style="font-size:13px;font-weight:700;margin-bottom:6px;">{row.Department}</div>
+              <div style="font-size:22px;font-weight:900;">{row.Sum/1000:,.1f} тис.</div>
+              <div style="font-size:12px;opacity:.7;margin-top:4px;">{row.Pct:.1f}% від загального</div>
+            </div>""", unsafe_allow_html=True)
+
+        st.markdown("<br>", unsafe_allow_html=True)
+        col_bar, col_pie2 = st.columns([1.4, 1])
+        with col_bar:
+            fig_dbar = figs.figure(dept_bar, dept_sum)
+            show_chart(fig_dbar, "dept_bar")
+
+        with col_pie2:
+            fig_dp = figs.figure(dept_pie, dept_sum, total=dept_total)
+            show_chart(fig_dp, "dept_pie")
+
+        st.markdown("#### 📋 Деталізація по відділах")
+        dept_detail = (
+            aggregate(["Department", "Parent_Description"])
+            .sort_values(["Department", "Sum"], ascending=[True, False])
         )
-        fig_dp.update_traces(
-            textposition="outside", textinfo="percent+label",
-            hovertemplate="<b>%{label}</b><br>%{value:,.0f}<extra></extra>",
+        dept_detail["Частка"] = (
+            dept_detail["Sum"] /
+            dept_detail.groupby("Department", observed=True)["Sum"].transform("sum") * 100
         )
-        fig_dp.update_layout(
-            height=360, margin=dict(l=0, r=0, t=20, b=20),
-            showlegend=False, paper_bgcolor="white",
-            annotations=[dict(
-                text=f"{dept_total/1000:,.0f}<br>тис.",
-                x=0.5, y=0.5, showarrow=False,
-                font=dict(size=14, color="#1a5276", family="Segoe UI"),
-            )],
+        # Числа йдуть у браузер числовими колонками Arrow, а форматує їх column_config —
+        # без рядка-на-значення в Python; сортування в таблиці теж числове.
+        st.dataframe(
+            dept_detail.rename(columns={
+                "Department": "🏢 Відділ",
+                "Parent_Description": "📌 Категорія",
+                "Sum": "Сума, $",
+            })[["🏢 Відділ", "📌 Категорія", "Сума, $", "Частка"]],
+            width='stretch', hide_index=True, height=350,
+            column_config={
+                "Сума, $": st.column_config.NumberColumn(format="accounting"),
+                "Частка": st.column_config.NumberColumn(format="%.1f%%"),
+            },
         )
-        st.plotly_chart(fig_dp, width='stretch')
-
-    st.markdown("#### 📋 Деталізація по відділах")
-    dept_detail = (
-        filtered_df.groupby(["Department", "Parent_Description"])["Sum"]
-        .sum().reset_index()
-        .sort_values(["Department", "Sum"], ascending=[True, False])
-    )
-    dept_detail["Частка"] = (
-        dept_detail["Sum"] /
-        dept_detail.groupby("Department")["Sum"].transform("sum") * 100
-    ).round(1).apply(lambda x: f"{x:.1f}%")
-    dept_detail["Сума, $"] = dept_detail["Sum"].apply(lambda x: f"{x:,.2f}")
-    st.dataframe(
-        dept_detail.rename(columns={
-            "Department": "🏢 Відділ",
-            "Parent_Description": "📌 Категорія",
-        })[["🏢 Відділ", "📌 Категорія", "Сума, $", "Частка"]],
-        width='stretch', hide_index=True, height=350,
-    )
 
 # ─────── TAB 2: ДИНАМІКА ─────────────────────────────────
 with tab_trends:
-    YEAR_COLORS = {
-        "2022": "#1f77b4", "2023": "#ff7f0e", "2024": "#d62728",
-        "2025": "#9467bd", "2026": "#17becf",
-    }
-    ym = (
-        df_raw[df_raw["Department"].isin(selected_depts) &
-               df_raw["Type_of_expense"].isin(selected_expenses)]
-        .groupby(["Month_Num", "Month_Name", "Year"])["Sum"]
-        .sum().reset_index()
-    )
-    month_order_t = [UA_MONTHS[i] for i in range(1, 13)]
-    ym["Month_Name"] = pd.Categorical(
-        ym["Month_Name"], categories=month_order_t, ordered=True)
-    ym["Year"] = ym["Year"].astype(str)
-    ym = ym.sort_values(["Year", "Month_Num"])
-    fig_line = go.Figure()
-    for yr in sorted(ym["Year"].unique()):
-        yr_data = ym[ym["Year"] == yr].sort_values("Month_Num")
-        color = YEAR_COLORS.get(yr, "#333333")
-        fig_line.add_trace(go.Scatter(
-            x=yr_data["Month_Name"], y=yr_data["Sum"],
-            name=yr, mode="lines+markers",
-            line=dict(color=color, width=2.5),
-            marker=dict(size=8, color=color),
-            fill="tozeroy",
-            fillcolor=hex_to_rgba(color, 0.08),
-            hovertemplate=f"<b>{yr}</b> %{{x}}: %{{y:,.0f}}<extra></extra>",
-        ))
-    fig_line.update_layout(
-        height=380, margin=dict(l=0, r=0, t=10, b=0),
-        legend=dict(orientation="h", yanchor="bottom", y=1.01,
-                    xanchor="left", x=0, title_text="Рік:", font_size=12),
-        yaxis=dict(tickformat=",.0f", gridcolor="#eef2f7", title=""),
-        xaxis=dict(title="", gridcolor="#eef2f7"),
-        plot_bgcolor="white", paper_bgcolor="white", hovermode="x unified",
-    )
-    st.plotly_chart(fig_line, width='stretch')
-
-    # Теплова карта
-    st.markdown("#### 🌡️ Теплова карта витрат по місяцях та роках")
-    heat_df = (
-        df_raw[df_raw["Department"].isin(selected_depts) &
-               df_raw["Type_of_expense"].isin(selected_expenses)]
-        .groupby(["Year", "Month_Num"])["Sum"].sum().reset_index()
-    )
-    heat_pivot = (
-        heat_df.pivot(index="Year", columns="Month_Num", values="Sum")
-        .reindex(columns=range(1, 13)).rename(columns=UA_MONTHS)
-    )
-    fig_heat = px.imshow(
-        heat_pivot, color_continuous_scale="Blues",
-        aspect="auto", text_auto=",.0f",
-        labels=dict(x="Місяць", y="Рік", color="Витрати"),
-    )
-    fig_heat.update_layout(
-        height=220, margin=dict(t=10, b=10, l=0, r=0),
-        xaxis_title="", yaxis_title="", coloraxis_showscale=False,
-    )
-    fig_heat.update_traces(textfont_size=10)
-    st.plotly_chart(fig_heat, width='stretch')
+    if tab_trends.open:
+        heat_df = aggregate(["Year", "Month_Num"], period=False)
+        ym = heat_df.assign(Month_Name=heat_df["Month_Num"].map(UA_MONTHS))
+        month_order_t = [UA_MONTHS[i] for i in range(1, 13)]
+        ym["Month_Name"] = pd.Categorical(
+            ym["Month_Name"], categories=month_order_t, ordered=True)
+        ym["Year"] = ym["Year"].astype(str)
+        ym = ym.sort_values(["Year", "Month_Num"])
+        fig_line = figs.figure(trend_line, ym)
+        show_chart(fig_line, "trend_line")
+
+        # Теплова карта
+        st.markdown("#### 🌡️ Теплова карта витрат по місяцях та роках")
+        heat_pivot = (
+            heat_df.pivot(index="Year", columns="Month_Num", values="Sum")
+            .reindex(columns=range(1, 13)).rename(columns=UA_MONTHS)
+        )
+        fig_heat = figs.figure(heatmap, heat_pivot)
+        show_chart(fig_heat, "heatmap")
 
 # ─────── TAB 3: ТОП ──────────────────────────────────────
 with tab_top:
-    top_n = st.slider("Кількість позицій", 5, 30, 15, key="top_slider")
-    top_df = (
-        filtered_df.groupby("Type_of_expense")["Sum"]
-        .sum().nlargest(top_n).sort_values(ascending=True).reset_index()
-    )
-    fig_top = go.Figure(go.Bar(
-        x=top_df["Sum"], y=top_df["Type_of_expense"],
-        orientation="h",
-        marker=dict(
-            color=top_df["Sum"],
-            colorscale=[[0, "#aac4de"], [1, "#c0392b"]],
-            showscale=False,
-        ),
-        text=[f"{v/1000:,.1f} тис." for v in top_df["Sum"]],
-        textposition="outside",
-        hovertemplate="<b>%{y}</b><br>%{x:,.0f}<extra></extra>",
-    ))
-    fig_top.update_layout(
-        height=max(400, top_n * 32 + 80),
-        margin=dict(l=0, r=80, t=10, b=10),
-        xaxis=dict(tickformat=",.0f", gridcolor="#eef2f7", title=""),
-        yaxis=dict(title=""),
-        plot_bgcolor="white", paper_bgcolor="white",
-    )
-    st.plotly_chart(fig_top, width='stretch')
-
-# ── Футер ─────────────────────────────────────────────────
-st.markdown(
-    f"<p style='text-align:right;font-size:11px;color:#aaa;margin-top:10px;'>",
-    unsafe_allow_html=True,
-)
-
+    @st.fragment
+    def top_chart(by_expense: pd.DataFrame) -> None:
+        """Слайдер перезапускає лише цей фрагмент: nlargest і графік ТОП."""
+        top_n = st.slider("Кількість позицій", 5, 30, 15, key="top_slider")
+        top_df = (
+            by_expense.set_index("Type_of_expense")["Sum"]
+            .nlargest(top_n).sort_values(ascending=True).reset_index()
+        )
+        fig_top = figs.figure(top_bar, top_df, top_n=top_n)
+        show_chart(fig_top, "top_bar")
+
+    if tab_top.open:
+        top_chart(by_expense)
+
+perf.record("script.run", (time.perf_counter() - run_started) * 1000)
+
+# ── Панель продуктивності (лише для адміністратора) ───────
+if st.session_state.get("is_admin"):
+    with st.expander("⏱ Продуктивність"):
+        perf_summary = perf.summary()
+        if perf_summary:
+            st.dataframe(pd.DataFrame.from_dict(perf_summary, orient="index").round(1), width='stretch')
+        st.caption(" · ".join(f"{k}: {v}" for k, v in sorted(perf.counters().items())))
+        cache_stats = {"Кеш фільтрів": fcache.stats(), "Кеш графіків": figs.stats()}
+        st.caption(" · ".join(
+            f"{label}: {s['entries']} записів, {s['bytes'] / 2**20:.1f} МБ, влучань {s['hit_rate']:.0%}"
+            for label, s in cache_stats.items()))
+        st.download_button("⬇️ Експорт JSON", perf.export_json(), file_name="perf.json",
+                           mime="application/json", key="perf_export")